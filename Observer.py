@@ -1,52 +1,156 @@
+import heapq
+import itertools
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 
 from network.client import NetworkClient
 
+
+class SensorScheduler:
+    """
+    Wspólny planista dla wielu obserwatorów: jeden wątek pilnuje kopca terminów,
+    a odczyty wykonuje niewielka pula wątków. Kolejny termin liczony jest od
+    poprzedniego terminu (a nie od końca odczytu), więc okres nie dryfuje.
+    """
+
+    def __init__(self, workers=4):
+        self._heap = []
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+        self._active = {}   # observer -> token bieżącej rejestracji
+        self._pending = {}  # observer -> Future trwającego odczytu
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="observer")
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="sensor-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._active.clear()
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=True)
+
+    def add(self, observer):
+        if not observer.sensor.frequency > 0:
+            raise ValueError(f"Nieprawidłowa częstotliwość sensora {observer.sensor.sensor_id}: "
+                             f"{observer.sensor.frequency}")
+        self.start()
+        with self._condition:
+            token = object()
+            self._active[observer] = token
+            heapq.heappush(self._heap, (time.monotonic(), next(self._sequence), observer, token))
+            self._condition.notify()
+
+    def remove(self, observer):
+        """Wyrejestrowuje obserwatora i czeka na zakończenie jego trwającego odczytu."""
+        with self._condition:
+            self._active.pop(observer, None)
+            future = self._pending.get(observer)
+        if future is not None:
+            future.result()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                deadline, _, observer, token = heapq.heappop(self._heap)
+                if self._active.get(observer) is not token:
+                    continue  # obserwator został zatrzymany
+                future = self._executor.submit(observer._sample)
+                self._pending[observer] = future
+            future.add_done_callback(lambda _, o=observer, t=token, d=deadline: self._reschedule(o, t, d))
+
+    def _reschedule(self, observer, token, deadline):
+        period = observer.sensor.frequency
+        next_deadline = deadline + period
+        now = time.monotonic()
+        if next_deadline < now:
+            # Odczyt trwał dłużej niż okres - pomijamy zaległe terminy zamiast je nadrabiać
+            next_deadline += ((now - next_deadline) // period + 1) * period
+        with self._condition:
+            self._pending.pop(observer, None)
+            if self._running and self._active.get(observer) is token:
+                heapq.heappush(self._heap, (next_deadline, next(self._sequence), observer, token))
+                self._condition.notify()
+
+
 class Observer:
-    def __init__(self, sensor, logger, network_client):
+    def __init__(self, sensor, logger, network_client, scheduler=None):
         self.sensor = sensor
         self.logger = logger
         self.network_client = network_client
+        # Z planistą obserwator nie ma własnego wątku - odczyty zleca SensorScheduler
+        self.scheduler = scheduler
 
         self._stop_event = threading.Event()
-        self._thread = threading.Thread(target=self._run)
+        self._thread = threading.Thread(target=self._run) if scheduler is None else None
 
     def start(self):
         self._stop_event.clear()
-        self._thread.start()
+        if self.scheduler is not None:
+            self.scheduler.add(self)
+        else:
+            self._thread.start()
         logging.info(f"[OBSERVER] Obserwowanie sensora: {self.sensor.sensor_id}")
 
     def stop(self):
         self._stop_event.set()
-        self._thread.join()
+        if self.scheduler is not None:
+            self.scheduler.remove(self)
+        else:
+            self._thread.join()
         logging.info(f"[OBSERVER] Zaprzestanie obserwowania: {self.sensor.sensor_id}")
 
     def _run(self):
+        next_deadline = time.monotonic()
         while not self._stop_event.is_set():
-            if self.sensor.active:
-                try:
-                    value = self.sensor.generate()
-                    timestamp = datetime.now()
-                    self.logger.log_reading(
-                        sensor_id=self.sensor.sensor_id,
-                        timestamp=timestamp,
-                        value=value,
-                        unit=self.sensor.unit
-                    )
-                    sent_ok = self.network_client.send_sensor_data(
-                        sensor_id=self.sensor.sensor_id,
-                        value=value,
-                        unit=self.sensor.unit,
-                        timestamp=timestamp
-                    )
-
-                    if not sent_ok:
-                        logging.warning(f"[OBSERVER] Niepowodzenia dla sensora: {self.sensor.sensor_id}")
-
-                except Exception as e:
-                    logging.error(f"[OBSERVER] Błąd w sensorze: {self.sensor.sensor_id}: {e}")
-
-            time.sleep(self.sensor.frequency)
+            self._sample()
+
+            # Termin liczony od poprzedniego terminu - czas odczytu i wysyłki nie dodaje się do okresu
+            next_deadline += self.sensor.frequency
+            now = time.monotonic()
+            if next_deadline < now:
+                next_deadline = now
+            self._stop_event.wait(next_deadline - now)
+
+    def _sample(self):
+        if self.sensor.active:
+            try:
+                value = self.sensor.generate()
+                timestamp = datetime.now()
+                self.logger.log_reading(
+                    sensor_id=self.sensor.sensor_id,
+                    timestamp=timestamp,
+                    value=value,
+                    unit=self.sensor.unit
+                )
+                sent_ok = self.network_client.send_sensor_data(
+                    sensor_id=self.sensor.sensor_id,
+                    value=value,
+                    unit=self.sensor.unit,
+                    timestamp=timestamp
+                )
+
+                if not sent_ok:
+                    logging.warning(f"[OBSERVER] Niepowodzenia dla sensora: {self.sensor.sensor_id}")
+
+            except Exception as e:
+                logging.error(f"[OBSERVER] Błąd w sensorze: {self.sensor.sensor_id}: {e}")
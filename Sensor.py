@@ -2,6 +2,17 @@ import random
 import time
 from datetime import datetime
 
+import numpy as np
+
+_rng = np.random.default_rng()
+
+
+def _batch_timestamps(start, frequency, n):
+    """Znaczniki czasu datetime64[us] co `frequency` sekund, począwszy od `start`."""
+    steps = np.rint(np.arange(n) * (np.asarray(frequency, dtype=np.float64)[..., None] * 1e6))
+    return np.datetime64(start or datetime.now(), 'us') + steps.astype('timedelta64[us]')
+
+
 class Sensor:
     def __init__(self, sensor_id, name, unit, min_value, max_value, frequency=1):
         """
@@ -23,15 +34,31 @@ class Sensor:
         self.active = True
         self.last_value = None
         self._callback = []
+        self._batch_callback = []
 
     def register_callback(self, callback):
         self._callback.append(callback)
 
+    def register_batch_callback(self, callback):
+        self._batch_callback.append(callback)
+
     def callback_notification(self, value):
         time = datetime.now()
         for callback in self._callback:
             callback(self.sensor_id, time, value, self.unit)
 
+    def batch_notification(self, timestamps, values):
+        """
+        Przekazuje paczkę odczytów: callbacki wsadowe dostają całe tablice jednym
+        wywołaniem, a zwykłe callbacki - każdy odczyt osobno.
+        """
+        for callback in self._batch_callback:
+            callback(self.sensor_id, timestamps, values, self.unit)
+        if self._callback:
+            for timestamp, value in zip(timestamps.tolist(), values.tolist()):
+                for callback in self._callback:
+                    callback(self.sensor_id, timestamp, value, self.unit)
+
 
     def generate(self):
         """
@@ -48,6 +75,27 @@ class Sensor:
 
         return value
 
+    def generate_batch(self, n, start=None, rng=None):
+        """
+        Symuluje n odczytów naraz (NumPy), z bieżącego przedziału [min_value, max_value].
+        Znaczniki czasu są rozłożone co `frequency` sekund od `start` (domyślnie teraz).
+        `rng` (np.random.Generator) pozwala uzyskać powtarzalne odczyty; domyślnie
+        używany jest wspólny generator modułu.
+
+        :return: krotka (values, timestamps) - tablice float64 i datetime64[us]
+        """
+        if not self.active:
+            raise Exception(f"Czujnik {self.name} jest wyłączony.")
+
+        values = (_rng if rng is None else rng).uniform(self.min_value, self.max_value, n)
+        timestamps = _batch_timestamps(start, self.frequency, n)
+        if n:
+            self.last_value = float(values[-1])
+
+        self.batch_notification(timestamps, values)
+
+        return values, timestamps
+
     def calibrate(self, calibration_factor):
         """
         Kalibruje ostatni odczyt przez przemnożenie go przez calibration_factor.
@@ -80,4 +128,32 @@ class Sensor:
         self.active = False
 
     def __str__(self):
-        return f"Sensor(id={self.sensor_id}, name={self.name}, unit={self.unit})"
\ No newline at end of file
+        return f"Sensor(id={self.sensor_id}, name={self.name}, unit={self.unit})"
+
+
+def generate_fleet_batch(sensors, n, start=None, rng=None):
+    """
+    Generuje po n odczytów dla wielu czujników jednym losowaniem NumPy.
+    Każdy wiersz wyniku odpowiada czujnikowi z listy `sensors` (jego przedziałowi
+    wartości i częstotliwości); paczki trafiają do callbacków poszczególnych czujników.
+    `rng` jak w Sensor.generate_batch.
+
+    :return: krotka (values, timestamps) - tablice o kształcie (len(sensors), n)
+    """
+    for sensor in sensors:
+        if not sensor.active:
+            raise Exception(f"Czujnik {sensor.name} jest wyłączony.")
+
+    low = np.array([sensor.min_value for sensor in sensors], dtype=np.float64)
+    high = np.array([sensor.max_value for sensor in sensors], dtype=np.float64)
+    frequency = np.array([sensor.frequency for sensor in sensors], dtype=np.float64)
+
+    values = (_rng if rng is None else rng).uniform(low[:, None], high[:, None], (len(sensors), n))
+    timestamps = _batch_timestamps(start, frequency, n)
+
+    for sensor, sensor_values, sensor_timestamps in zip(sensors, values, timestamps):
+        if n:
+            sensor.last_value = float(sensor_values[-1])
+        sensor.batch_notification(sensor_timestamps, sensor_values)
+
+    return values, timestamps
@@ -0,0 +1,264 @@
+"""
+Benchmark ścieżki odbioru danych: uruchamia serwer na localhost (NetworkServer
+albo ścieżkę odbioru ServerGUI bez okna), zasila go flotą symulowanych czujników
+i raportuje przepustowość (odczyty/s), opóźnienie ACK (p50/p99), czas CPU i RSS.
+
+Przykład:
+    python benchmark.py --target server --mode async --sensors 16 --readings 5000
+    python benchmark.py --target gui --protocol binary --output bench_output.txt
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows - brak pomiaru CPU/RSS przez getrusage
+    resource = None
+
+from AirQualitySensor import AirQualitySensor
+from HumiditySensor import HumiditySensor
+from PressureSensor import PressureSensor
+from TemperatureSensor import TemperatureSensor
+from network.client import NetworkClient
+from server.server import NetworkServer
+
+SENSOR_TYPES = (
+    ("T", TemperatureSensor),
+    ("H", HumiditySensor),
+    ("P", PressureSensor),
+    ("AQ", AirQualitySensor),
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark odbioru odczytów czujników")
+    parser.add_argument("--target", choices=("server", "gui"), default="server",
+                        help="NetworkServer albo ścieżka odbioru ServerGUI (bez okna)")
+    parser.add_argument("--mode", choices=("async", "blocking"), default="async",
+                        help="tryb NetworkServer")
+    parser.add_argument("--workers", type=int, default=1, help="procesy robocze NetworkServer")
+    parser.add_argument("--sensors", type=int, default=8, help="liczba symulowanych czujników (klientów)")
+    parser.add_argument("--readings", type=int, default=2000, help="odczyty na jeden czujnik")
+    parser.add_argument("--batch-size", type=int, default=100, help="odczyty w jednej paczce send_batch")
+    parser.add_argument("--protocol", choices=("json", "binary"), default="json")
+    parser.add_argument("--buffer-size", type=int, default=1000, help="buffer_size Loggera")
+    parser.add_argument("--seed", type=int, default=2025, help="ziarno generatora odczytów")
+    parser.add_argument("--output", help="dopisz raport do pliku (np. bench_output.txt)")
+    return parser.parse_args(argv)
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Serwer nie nasłuchuje na porcie {port}")
+
+
+def write_configs(directory, args, port):
+    json_path = os.path.join(directory, "config.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "log_dir": os.path.join(directory, "logs"),
+            "filename_pattern": "sensors_%Y%m%d.csv",
+            "buffer_size": args.buffer_size,
+            "flush_interval_ms": 500,
+            "rotate_every_hours": 24,
+            "max_size_mb": 1024,
+            "rotate_after_lines": 100_000_000,
+            "retention_days": 10,
+        }, f)
+
+    yaml_path = os.path.join(directory, "config.yaml")
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        f.write(f"client:\n  host: 127.0.0.1\n  port: {port}\n  timeout: 30.0\n  retries: 3\n"
+                f"  persistent: true\n  batch_size: {args.batch_size}\n  protocol: {args.protocol}\n"
+                f"server:\n  host: 127.0.0.1\n  port: {port}\n  mode: {args.mode}\n"
+                f"  workers: {args.workers}\n  log_path: {os.path.join(directory, 'logs')}\n")
+    return yaml_path, json_path
+
+
+def build_fleet(count, readings, seed=None):
+    """Czujniki wszystkich typów na zmianę; odczyty są generowane z góry, poza pomiarem."""
+    rng = np.random.default_rng(seed)
+    fleet = []
+    start = datetime(2025, 1, 1)
+    for n in range(count):
+        prefix, sensor_class = SENSOR_TYPES[n % len(SENSOR_TYPES)]
+        sensor = sensor_class(f"{prefix}-{n:03d}")
+        values, timestamps = sensor.generate_batch(readings, start=start, rng=rng)
+        fleet.append([(sensor.sensor_id, value, sensor.unit, timestamp)
+                      for value, timestamp in zip(values.tolist(), timestamps.tolist())])
+    return fleet
+
+
+class GuiIngest:
+    """
+    Ścieżka odbioru ServerGUI bez okna Tkinter: ten sam handle_client,
+    SensorDataManager i wspólny potok Loggera, bez widżetów i timera odświeżania.
+    """
+
+    def __init__(self, json_path, port):
+        from server_gui import SensorIngest
+
+        self.gui = SensorIngest()
+        self.json_path = json_path
+        self.port = port
+        self._thread = None
+
+    def start(self):
+        self.gui.start_logging(self.json_path)
+        self.gui.is_running = True
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", self.port))
+        self._socket.listen(128)
+        self._socket.settimeout(0.5)
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while self.gui.is_running:
+            try:
+                client_socket, address = self._socket.accept()
+            except socket.timeout:
+                continue
+            self.gui.serve_client(client_socket, address)
+
+    def stop(self):
+        self.gui.stop_clients()
+        self._thread.join()
+        self._socket.close()
+        self.gui.stop_logging()
+
+
+class ServerIngest:
+    def __init__(self, yaml_path, json_path):
+        self.server = NetworkServer(yaml_path, json_path)
+        self.stop_event = threading.Event()
+        self._thread = threading.Thread(target=self.server.serve, args=(self.stop_event,), daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self._thread.join()
+
+
+def drive_sensor(yaml_path, readings, batch_size, latencies, failures):
+    client = NetworkClient(yaml_path)
+    try:
+        for i in range(0, len(readings), batch_size):
+            batch = readings[i:i + batch_size]
+            started = time.perf_counter()
+            sent = client.send_batch(batch)
+            latencies.append(time.perf_counter() - started)
+            failures.append(len(batch) - sent)
+    finally:
+        client.close()
+
+
+def cpu_and_rss():
+    if resource is None:
+        return None, None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    rss_kb = max(own.ru_maxrss, children.ru_maxrss)  # Linux: KiB
+    return cpu, rss_kb
+
+
+def run(args):
+    fleet = build_fleet(args.sensors, args.readings, args.seed)
+    total = args.sensors * args.readings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        yaml_path, json_path = write_configs(tmp, args, port)
+        # Komunikaty serwera i loggera na stdout nie wchodzą do pomiaru
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            ingest = GuiIngest(json_path, port) if args.target == "gui" else ServerIngest(yaml_path, json_path)
+            ingest.start()
+            wait_for_port(port)
+
+            latencies = []
+            failures = []
+            threads = [threading.Thread(target=drive_sensor,
+                                        args=(yaml_path, readings, args.batch_size, latencies, failures))
+                       for readings in fleet]
+            cpu_before, _ = cpu_and_rss()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            ingest.stop()
+            cpu_after, rss_kb = cpu_and_rss()
+
+    lost = sum(failures)
+    latencies_ms = np.array(latencies) * 1000
+    report = {
+        "target": args.target if args.target == "gui" else f"server/{args.mode}/workers={args.workers}",
+        "protocol": args.protocol,
+        "sensors": args.sensors,
+        "readings": total,
+        "lost": lost,
+        "seconds": elapsed,
+        "readings_per_s": (total - lost) / elapsed,
+        "ack_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "ack_p99_ms": float(np.percentile(latencies_ms, 99)),
+        "cpu_s": None if cpu_before is None else cpu_after - cpu_before,
+        "max_rss_mb": None if rss_kb is None else rss_kb / 1024,
+    }
+    return report
+
+
+def format_report(report, batch_size):
+    cpu = "n/d" if report["cpu_s"] is None else f"{report['cpu_s']:.2f} s"
+    rss = "n/d" if report["max_rss_mb"] is None else f"{report['max_rss_mb']:.1f} MB"
+    return (
+        f"[BENCH] {datetime.now().isoformat(timespec='seconds')} {report['target']} "
+        f"protokół={report['protocol']} czujniki={report['sensors']}\n"
+        f"  odczyty: {report['readings']} (utracone: {report['lost']}) w {report['seconds']:.2f} s"
+        f" -> {report['readings_per_s']:.0f} odczytów/s\n"
+        f"  opóźnienie ACK paczki ({batch_size} odczytów): p50={report['ack_p50_ms']:.2f} ms"
+        f" p99={report['ack_p99_ms']:.2f} ms\n"
+        f"  CPU (serwer + klienci): {cpu}, maks. RSS: {rss}\n"
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Logi INFO klienta przy każdej paczce zaburzałyby pomiar
+    logging.getLogger().setLevel(logging.WARNING)
+    text = format_report(run(args), args.batch_size)
+    sys.stdout.write(text)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
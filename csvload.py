@@ -0,0 +1,267 @@
+import csv
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from logger import local_timestamp
+
+# Ładowanie plików logów CSV bezpośrednio do tablic NumPy: plik jest mapowany
+# w pamięć (mmap) i oglądany jako tablica bajtów bez kopiowania, a kolumny są
+# parsowane operacjami wektorowymi - bez listy napisów na każdy wiersz jak w csv.reader.
+#   - pola są wycinane z mapowanego bufora do tablic napisów bajtowych stałej
+#     szerokości, a znaczniki czasu i wartości konwertowane parserami NumPy (astype),
+#   - sensor_id i unit są słownikowane (kody + listy nazw).
+# Wiersze nietypowe (cudzysłowy, inna liczba pól, znaczniki ze strefą czasową -
+# przeliczane na lokalny czas bez strefy, jak w Loggerze) są parsowane modułem csv, a uszkodzone pomijane - tak jak
+# w CsvStorage.iter_rows.
+#
+# Zakres bajtów [start, end) obejmuje wiersze, które się w nim zaczynają, więc
+# sąsiednie zakresy (split_ranges) dzielą plik na rozłączne części dla wielu procesów.
+
+_NEWLINE = ord('\n')
+_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]  # YYYY-MM-DD?HH:MM:SS
+_SEPARATORS = ((4, '-'), (7, '-'), (13, ':'), (16, ':'))
+_DAYS_IN_MONTH = np.array([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_MIN_RANGE_BYTES = 1 << 20
+
+
+def _line_bounds(data, start: int, end: Optional[int]) -> Tuple[int, int]:
+    """Granice wierszy, które zaczynają się w [start, end)."""
+    size = len(data)
+    if end is None or end > size:
+        end = size
+    if start > 0:
+        newline = data.find(b'\n', start - 1)
+        start = size if newline < 0 else newline + 1
+    if end < size:
+        newline = data.find(b'\n', end - 1)
+        end = size if newline < 0 else newline + 1
+    return start, max(start, end)
+
+
+def byte_ranges(size: int, chunk_bytes: int, start: int = 0) -> List[Tuple[int, int]]:
+    """Kolejne zakresy bajtów [lo, hi) po chunk_bytes od start do size."""
+    bounds = list(range(start, size, max(chunk_bytes, 1))) + [size]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def split_ranges(file_path: str, parts: int, start: int = 0) -> List[Tuple[int, int]]:
+    """Dzieli plik (od bajtu start) na parts zakresów bajtów o zbliżonej wielkości."""
+    size = os.path.getsize(file_path)
+    parts = max(1, min(parts, (size - start) // _MIN_RANGE_BYTES + 1))
+    return byte_ranges(size, -(-(size - start) // parts), start)
+
+
+def _gather(buf, starts, lengths):
+    """
+    Pola o podanych początkach i długościach jako tablica napisów bajtowych stałej
+    szerokości. Wiersze są kopiowane z widoku okien przesuwnych na buforze (bez kopii
+    bufora), a bajty za końcem pola zerowane.
+    """
+    width = max(int(lengths.max()) if len(lengths) else 1, 1)
+    if len(buf) < width:
+        buf = np.concatenate((buf, np.zeros(width - len(buf), dtype=np.uint8)))
+    last_window = len(buf) - width
+    chars = sliding_window_view(buf, width)[np.minimum(starts, last_window)]
+    # Okno przy końcu bufora musiało zostać przesunięte - takie pola (co najwyżej kilka) kopiujemy osobno
+    for i in np.flatnonzero(starts > last_window).tolist():
+        start, length = int(starts[i]), int(lengths[i])
+        chars[i] = 0
+        chars[i, :length] = buf[start:start + length]
+    chars *= np.arange(width) < lengths[:, None]
+    return chars.view(f'S{width}').ravel()
+
+
+def _dictionary(names):
+    """Kody int64 i lista nazw (str) dla tablicy napisów bajtowych."""
+    if not len(names):
+        return np.empty(0, dtype=np.int64), []
+    unique, codes = np.unique(names, return_inverse=True)
+    return codes.astype(np.int64), [name.decode('utf-8') for name in unique.tolist()]
+
+
+def _two_digits(digits, position):
+    return digits[:, position].astype(np.int16) * 10 + digits[:, position + 1]
+
+
+def _parse_timestamps(fields):
+    """
+    Zwraca (datetime64[us], maska poprawnych) dla pól znaczników czasu w formacie
+    isoformat bez strefy (YYYY-MM-DDTHH:MM:SS[.ffffff]). Pola są najpierw sprawdzane
+    wektorowo (NumPy przyjąłby też np. "2025" czy "now", a błąd w trakcie rzutowania
+    napisów bajtowych potrafi zakończyć się awarią), a poprawne konwertowane parserem
+    NumPy. Pozostałe formaty, w tym strefy czasowe, trafiają do ścieżki wolnej.
+    """
+    if not len(fields) or fields.dtype.itemsize < 19:
+        return np.full(len(fields), np.datetime64('NaT'), dtype='datetime64[us]'), np.zeros(len(fields), bool)
+    chars = fields.view(np.uint8).reshape(len(fields), -1)
+    lengths = np.char.str_len(fields)
+    fraction = lengths == 26
+    ok = (lengths == 19) | fraction
+    digits = chars[:, :26] - np.uint8(ord('0'))  # znaki spoza cyfr zawijają się do wartości > 9
+    ok &= (digits[:, _DIGITS] < 10).all(axis=1)
+    for position, char in _SEPARATORS:
+        ok &= chars[:, position] == ord(char)
+    ok &= (chars[:, 10] == ord('T')) | (chars[:, 10] == ord(' '))
+    if fraction.any():
+        ok &= ~fraction | ((chars[:, 19] == ord('.')) & (digits[:, 20:26] < 10).all(axis=1))
+
+    year = _two_digits(digits, 0).astype(np.int32) * 100 + _two_digits(digits, 2)
+    month = _two_digits(digits, 5)
+    day = _two_digits(digits, 8)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_ok = (month >= 1) & (month <= 12)
+    ok &= month_ok & (day >= 1) & (day <= _DAYS_IN_MONTH[np.where(month_ok, month, 0)] - ((month == 2) & ~leap))
+    ok &= (_two_digits(digits, 11) < 24) & (_two_digits(digits, 14) < 60) & (_two_digits(digits, 17) < 60)
+    return np.where(ok, fields, b'NaT').astype('datetime64[us]'), ok
+
+
+def _parse_values(fields):
+    """Zwraca (float64, maska poprawnych); przy błędzie konwersji całości - wartość po wartości."""
+    try:
+        return fields.astype(np.float64), np.ones(len(fields), dtype=bool)
+    except ValueError:
+        values = np.zeros(len(fields), dtype=np.float64)
+        ok = np.ones(len(fields), dtype=bool)
+        for i, field in enumerate(fields.tolist()):
+            try:
+                values[i] = float(field)
+            except ValueError:
+                ok[i] = False
+        return values, ok
+
+
+def _parse_lines(lines):
+    """Wolna ścieżka dla nietypowych wierszy: moduł csv + datetime.fromisoformat."""
+    rows = []
+    for row in csv.reader(line.decode('utf-8', errors='replace') for line in lines):
+        try:
+            timestamp = local_timestamp(datetime.fromisoformat(row[0]))
+            rows.append(((timestamp - _EPOCH) // _MICROSECOND, float(row[2]),
+                         row[1].encode('utf-8'), row[3].encode('utf-8')))
+        except (ValueError, IndexError):
+            continue  # nagłówek, niepełny lub uszkodzony wiersz
+    return rows
+
+
+def _parse(buf) -> Dict:
+    """Parsuje bufor z pełnymi wierszami (każdy zakończony '\\n', poza ewentualnie ostatnim)."""
+    size = len(buf)
+    ends = np.flatnonzero(buf == _NEWLINE)
+    if not len(ends) or ends[-1] != size - 1:
+        ends = np.append(ends, size)  # ostatni wiersz bez znaku nowej linii
+    starts = np.concatenate(([0], ends[:-1] + 1)).astype(np.int64)
+    # csv.writer kończy wiersze "\r\n"
+    line_ends = ends - ((ends > starts) & (buf[np.maximum(ends - 1, 0)] == ord('\r')))
+    keep = line_ends > starts
+    starts, line_ends = starts[keep], line_ends[keep]
+
+    commas = np.flatnonzero(buf == ord(','))
+    first_comma = np.searchsorted(commas, starts)
+    comma_count = np.searchsorted(commas, line_ends) - first_comma
+    quotes = np.flatnonzero(buf == ord('"'))
+    quoted = np.searchsorted(quotes, line_ends) > np.searchsorted(quotes, starts)
+    regular = (comma_count == 3) & ~quoted
+
+    # Pozycje przecinków (c0, c1, c2) tylko dla wierszy z czterema polami bez cudzysłowów
+    rows = np.flatnonzero(regular)
+    c0, c1, c2 = (commas[first_comma[rows] + k] for k in range(3))
+    timestamps, ok = _parse_timestamps(_gather(buf, starts[rows], c0 - starts[rows]))
+    rows, timestamps, c0, c1, c2 = rows[ok], timestamps[ok], c0[ok], c1[ok], c2[ok]
+    values, ok = _parse_values(_gather(buf, c1 + 1, c2 - c1 - 1))
+    rows, timestamps, values, c0, c1, c2 = rows[ok], timestamps[ok], values[ok], c0[ok], c1[ok], c2[ok]
+    sensors = _gather(buf, c0 + 1, c1 - c0 - 1)
+    units = _gather(buf, c2 + 1, line_ends[rows] - c2 - 1)
+
+    parsed = np.zeros(len(starts), dtype=bool)
+    parsed[rows] = True
+    irregular = np.flatnonzero(~parsed)
+    if len(irregular):
+        lines = [bytes(buf[start:end]) for start, end in zip(starts[irregular].tolist(), line_ends[irregular].tolist())]
+        rows = _parse_lines(lines)
+        if rows:
+            # Wiersze ze ścieżki wolnej trafiają na koniec - kolejność w paczce nie jest gwarantowana
+            extra_micros, extra_values, extra_sensors, extra_units = zip(*rows)
+            timestamps = np.concatenate((timestamps, np.array(extra_micros, dtype=np.int64).astype('datetime64[us]')))
+            values = np.concatenate((values, np.array(extra_values, dtype=np.float64)))
+            sensors = np.concatenate((sensors, np.array(extra_sensors, dtype=bytes)))
+            units = np.concatenate((units, np.array(extra_units, dtype=bytes)))
+
+    sensor_codes, sensor_names = _dictionary(sensors)
+    unit_codes, unit_names = _dictionary(units)
+    return {
+        "timestamp": timestamps,
+        "value": values,
+        "sensor": sensor_codes,
+        "unit": unit_codes,
+        "sensors": sensor_names,
+        "units": unit_names,
+    }
+
+
+def load_buffer(data, start: int = 0, end: Optional[int] = None) -> Dict:
+    """
+    Parsuje wiersze CSV z bufora (bytes, mmap) zaczynające się w zakresie bajtów
+    [start, end) do tablic: timestamp (datetime64[us]), value (float64) oraz kody
+    sensor/unit wskazujące na listy nazw sensors/units - w układzie
+    ColumnarStorage.iter_columns. Nagłówek i uszkodzone wiersze są pomijane.
+    """
+    start, end = _line_bounds(data, start, end)
+    if start == end:
+        return concat_chunks([])
+    buf = np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start)
+    try:
+        return _parse(buf)
+    finally:
+        del buf  # widok na mmap musi zniknąć przed jego zamknięciem
+
+
+def load_csv(file_path: str, start: int = 0, end: Optional[int] = None) -> Dict:
+    """Wczytuje wiersze pliku CSV z zakresu bajtów [start, end) (domyślnie cały plik) przez mmap."""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return concat_chunks([])  # pustego pliku nie da się zmapować
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return load_buffer(mm, start, end)
+
+
+def _load_range(args):
+    return load_csv(*args)
+
+
+def concat_chunks(chunks: List[Dict]) -> Dict:
+    """Łączy paczki w jedną, przekodowując słowniki nazw na wspólny."""
+    result = {}
+    indexes = {"sensors": {}, "units": {}}
+    parts = {"timestamp": [], "value": [], "sensor": [], "unit": []}
+    for chunk in chunks:
+        parts["timestamp"].append(chunk["timestamp"])
+        parts["value"].append(chunk["value"])
+        for column, names in (("sensor", "sensors"), ("unit", "units")):
+            index = indexes[names]
+            mapping = np.array([index.setdefault(name, len(index)) for name in chunk[names]], dtype=np.int64)
+            parts[column].append(mapping[chunk[column]] if len(mapping) else chunk[column].astype(np.int64))
+    for column, dtype in (("timestamp", 'datetime64[us]'), ("value", np.float64),
+                          ("sensor", np.int64), ("unit", np.int64)):
+        result[column] = np.concatenate(parts[column]) if parts[column] else np.empty(0, dtype=dtype)
+    result["sensors"] = list(indexes["sensors"])
+    result["units"] = list(indexes["units"])
+    return result
+
+
+def load_csv_parallel(file_path: str, workers: Optional[int] = None, start: int = 0) -> Dict:
+    """Wczytuje plik równolegle: każdy proces parsuje własny zakres bajtów (split_ranges)."""
+    workers = workers or os.cpu_count() or 1
+    ranges = split_ranges(file_path, workers, start)
+    if len(ranges) == 1:
+        return load_csv(file_path, *ranges[0])
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        chunks = list(executor.map(_load_range, [(file_path, lo, hi) for lo, hi in ranges]))
+    return concat_chunks(chunks)
@@ -0,0 +1,206 @@
+import heapq
+import struct
+from datetime import datetime, timedelta
+
+# Format archiwum szeregów czasowych (.tsz) w stylu Gorilla: odczyty z pliku logu
+# są dzielone na szeregi (sensor_id, unit), a każdy szereg kodowany strumieniem bitów:
+#   - znaczniki czasu (mikrosekundy od epoki) jako delta-of-delta - przy stałej
+#     częstotliwości próbkowania większość odczytów zajmuje 1 bit,
+#   - wartości float64 jako XOR z poprzednią wartością - zapisywane są tylko
+#     znaczące bity (bez zer wiodących i końcowych), a powtórzona wartość to 1 bit.
+# Kodowanie jest bezstratne; znaczniki czasu ze strefą są zapisywane w czasie lokalnym
+# bez strefy (jak logger.local_timestamp).
+
+MAGIC = b'TSZ1\n'
+SUFFIX = '.tsz'
+
+_COUNT = struct.Struct('<I')
+_NAME = struct.Struct('<H')
+_SERIES = struct.Struct('<II')  # liczba odczytów, długość strumienia bitów w bajtach
+_FLOAT = struct.Struct('<d')
+_UINT64 = struct.Struct('<Q')
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Przedziały delta-of-delta: (prefiks, liczba bitów prefiksu, bity wartości).
+# Gorilla używa sekund; tu znaczniki mają mikrosekundy, więc przedziały są szersze,
+# żeby typowe drgania zegara (ułamki milisekund) mieściły się w 14 lub 21 bitach.
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 14), (0b1110, 4, 21))
+_DOD_FALLBACK = (0b1111, 4, 64)
+
+
+class BitWriter:
+    def __init__(self):
+        self._bytes = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value: int, bits: int):
+        self._acc = (self._acc << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self._bytes.append((self._acc >> self._bits) & 0xFF)
+        self._acc &= (1 << self._bits) - 1
+
+    def getvalue(self) -> bytes:
+        if self._bits:
+            return bytes(self._bytes) + bytes([(self._acc << (8 - self._bits)) & 0xFF])
+        return bytes(self._bytes)
+
+
+class BitReader:
+    def __init__(self, data: bytes):
+        self._data = data
+        self._position = 0
+
+    def read(self, bits: int) -> int:
+        start = self._position >> 3
+        end_bit = self._position + bits
+        end = (end_bit + 7) >> 3
+        if end > len(self._data):
+            raise ValueError("Koniec strumienia bitów")
+        self._position = end_bit
+        chunk = int.from_bytes(self._data[start:end], 'big')
+        return (chunk >> ((end << 3) - end_bit)) & ((1 << bits) - 1)
+
+
+def _to_micros(timestamp: datetime) -> int:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return (timestamp - _EPOCH) // _MICROSECOND
+
+
+def _float_bits(value: float) -> int:
+    return _UINT64.unpack(_FLOAT.pack(value))[0]
+
+
+def encode_series(timestamps, values) -> bytes:
+    """Koduje jeden szereg (znaczniki czasu w mikrosekundach, wartości float)."""
+    writer = BitWriter()
+    prev_time = prev_delta = 0
+    prev_bits = 0
+    prev_leading, prev_trailing = 64, 0
+    for i, (time_us, value) in enumerate(zip(timestamps, values)):
+        bits = _float_bits(value)
+        if i == 0:
+            writer.write(time_us, 64)
+            writer.write(bits, 64)
+            prev_time, prev_bits = time_us, bits
+            continue
+
+        delta = time_us - prev_time
+        dod = delta - prev_delta
+        if dod == 0:
+            writer.write(0, 1)
+        else:
+            for prefix, prefix_bits, value_bits in _DOD_BUCKETS + (_DOD_FALLBACK,):
+                if -(1 << (value_bits - 1)) <= dod < (1 << (value_bits - 1)) or value_bits == 64:
+                    writer.write(prefix, prefix_bits)
+                    writer.write(dod, value_bits)
+                    break
+        prev_time, prev_delta = time_us, delta
+
+        xor = bits ^ prev_bits
+        if xor == 0:
+            writer.write(0, 1)
+        else:
+            leading = min(64 - xor.bit_length(), 31)
+            trailing = (xor & -xor).bit_length() - 1
+            if leading >= prev_leading and trailing >= prev_trailing:
+                # Znaczące bity mieszczą się w oknie poprzedniej wartości
+                writer.write(0b10, 2)
+                writer.write(xor >> prev_trailing, 64 - prev_leading - prev_trailing)
+            else:
+                length = 64 - leading - trailing
+                writer.write(0b11, 2)
+                writer.write(leading, 5)
+                writer.write(length - 1, 6)
+                writer.write(xor >> trailing, length)
+                prev_leading, prev_trailing = leading, trailing
+        prev_bits = bits
+    return writer.getvalue()
+
+
+def decode_series(data: bytes, count: int):
+    """Zwraca listy (znaczniki czasu w mikrosekundach, wartości) szeregu z encode_series."""
+    reader = BitReader(data)
+    timestamps = []
+    values = []
+    if not count:
+        return timestamps, values
+    time_us = reader.read(64)
+    bits = reader.read(64)
+    if time_us >= 1 << 63:
+        time_us -= 1 << 64
+    timestamps.append(time_us)
+    values.append(_FLOAT.unpack(_UINT64.pack(bits))[0])
+    delta = 0
+    leading, trailing = 64, 0
+    for _ in range(count - 1):
+        if reader.read(1):
+            for prefix, prefix_bits, value_bits in _DOD_BUCKETS + (_DOD_FALLBACK,):
+                # Prefiksy to kolejne jedynki zakończone zerem (ostatni - same jedynki)
+                if value_bits == 64 or not reader.read(1):
+                    dod = reader.read(value_bits)
+                    if dod >= 1 << (value_bits - 1):
+                        dod -= 1 << value_bits
+                    delta += dod
+                    break
+        time_us += delta
+        timestamps.append(time_us)
+
+        if reader.read(1):
+            if reader.read(1):
+                leading = reader.read(5)
+                length = reader.read(6) + 1
+                trailing = 64 - leading - length
+            bits ^= reader.read(64 - leading - trailing) << trailing
+        values.append(_FLOAT.unpack(_UINT64.pack(bits))[0])
+    return timestamps, values
+
+
+def write_archive(rows, fileobj):
+    """Zapisuje wiersze (timestamp, sensor_id, value, unit) jako archiwum .tsz."""
+    series = {}
+    for timestamp, sensor_id, value, unit in rows:
+        # Nazwy zapisywane są jako tekst - identyfikator czujnika może być liczbą
+        times, values = series.setdefault((str(sensor_id), str(unit)), ([], []))
+        times.append(_to_micros(timestamp))
+        values.append(float(value))
+
+    fileobj.write(MAGIC)
+    fileobj.write(_COUNT.pack(len(series)))
+    for (sensor_id, unit), (times, values) in series.items():
+        for name in (sensor_id, unit):
+            encoded = name.encode('utf-8')
+            fileobj.write(_NAME.pack(len(encoded)) + encoded)
+        data = encode_series(times, values)
+        fileobj.write(_SERIES.pack(len(values), len(data)))
+        fileobj.write(data)
+
+
+def iter_series(raw):
+    """Zwraca kolejne szeregi archiwum .tsz jako (sensor_id, unit, znaczniki w mikrosekundach, wartości)."""
+    if raw.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Plik nie jest archiwum .tsz")
+    (series_count,) = _COUNT.unpack(raw.read(_COUNT.size))
+    for _ in range(series_count):
+        names = []
+        for _ in range(2):
+            (length,) = _NAME.unpack(raw.read(_NAME.size))
+            names.append(raw.read(length).decode('utf-8'))
+        count, size = _SERIES.unpack(raw.read(_SERIES.size))
+        times, values = decode_series(raw.read(size), count)
+        yield names[0], names[1], times, values
+
+
+def iter_archive(raw):
+    """
+    Zwraca krotki (timestamp, sensor_id, value, unit) z archiwum .tsz.
+    Szeregi są dekodowane osobno i scalane po znaczniku czasu (heapq.merge).
+    """
+    decoded = [[(_EPOCH + timedelta(microseconds=t), sensor_id, v, unit) for t, v in zip(times, values)]
+               for sensor_id, unit, times, values in iter_series(raw)]
+    return heapq.merge(*decoded, key=lambda row: row[0])
@@ -1,12 +1,55 @@
 import os
 import json
-import csv
+import heapq
+import queue
+import re
+import threading
+import time
 import zipfile
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
-from typing import Iterator, Dict, Optional
+from typing import Iterator, Dict, List, Optional
+
+import gorilla
+import rollup
+from storage import STORAGE_BACKENDS, detect_storage
+
+# Formaty archiwów: "zip" (plik logu w ZIP, kodek archive_codec) lub "tsz"
+# (szeregi czasowe kodowane delta-of-delta/XOR, moduł gorilla)
+ARCHIVE_FORMATS = {
+    'zip': '.zip',
+    'tsz': gorilla.SUFFIX,
+}
+
+ARCHIVE_CODECS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflated': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+# Pliki towarzyszące (sidecary) pliku logu: zakres czasu, liczba wierszy
+# i liczniki czujników oraz rzadki indeks "znacznik czasu -> offset w bajtach"
+META_SUFFIX = '.meta.json'
+INDEX_SUFFIX = '.idx'
+SIDECAR_SUFFIXES = (META_SUFFIX, INDEX_SUFFIX)
+
+
+def local_timestamp(timestamp: datetime) -> datetime:
+    """
+    Sprowadza znacznik czasu do czasu lokalnego bez strefy - w tej postaci logger
+    przechowuje i porównuje wszystkie znaczniki. Odczyty ze strefą (ramki
+    READING_UTC, JSON z przesunięciem) mieszają się z odczytami bez strefy,
+    a porównanie takich datetime kończy się TypeError.
+    """
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
 
 class Logger:
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, shard: Optional[int] = None):
         with open(config_path, 'r') as f:
             self.config = json.load(f)
 
@@ -18,44 +61,149 @@ class Logger:
             self.log_dir = os.path.join(config_dir, log_dir_from_config)
 
         self.filename_pattern = self.config['filename_pattern']
+        # Serwer wieloprocesowy: każdy proces zapisuje własny plik (shard), np. sensors_%Y%m%d.w0.csv
+        self.shard = shard
+        self._base_pattern = self.filename_pattern
+        if shard is not None:
+            root, ext = os.path.splitext(self.filename_pattern)
+            self.filename_pattern = f"{root}.w{shard}{ext}"
+        # Długość nazwy pliku wg wzorca - pozwala odczytać datę z prefiksu nazwy archiwum
+        self._pattern_length = len(datetime(2000, 1, 1).strftime(self.filename_pattern))
         self.buffer_size = self.config['buffer_size']
         self.rotate_every_hours = self.config['rotate_every_hours']
         self.max_size_mb = self.config['max_size_mb']
         self.rotate_after_lines = self.config.get('rotate_after_lines')
         self.retention_days = self.config['retention_days']
+        # Co ile flushy rozmiar pliku jest weryfikowany na dysku (0 - nigdy)
+        self.stat_every_flushes = self.config.get('stat_every_flushes', 100)
+        # Co ile wierszy zapisywany jest wpis rzadkiego indeksu (0 - bez indeksu)
+        self.index_every_rows = self.config.get('index_every_rows', 1000)
+        # Group commit: bufor jest zapisywany po buffer_size wierszach albo po
+        # flush_interval_ms od ostatniego zapisu (wątek w tle; 0 - wyłączone)
+        self.flush_interval_ms = self.config.get('flush_interval_ms', 0)
+        # Polityka fsync: "never" - zostawia to systemowi, "flush" - po każdym zapisie bufora
+        self.fsync = self.config.get('fsync', 'never')
+        # Archiwizacja: kodek ZIP, poziom kompresji i praca w tle (poza ścieżką zapisu)
+        self.archive_codec = self.config.get('archive_codec', 'deflated')
+        self.archive_compresslevel = self.config.get('archive_compresslevel')
+        self.archive_in_background = self.config.get('archive_in_background', True)
+        self.archive_format = self.config.get('archive_format', 'zip')
+        if self.archive_codec not in ARCHIVE_CODECS:
+            raise ValueError(f"Nieznany kodek archiwum: {self.archive_codec}")
+        if self.archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Nieznany format archiwum: {self.archive_format}")
+        # Format plików logów: "csv" (domyślny) lub "columnar" (segmenty kolumnowe, storage.py)
+        storage_name = self.config.get('storage', 'csv')
+        if storage_name not in STORAGE_BACKENDS:
+            raise ValueError(f"Nieznany format zapisu: {storage_name}")
+        self.storage = STORAGE_BACKENDS[storage_name]()
 
         os.makedirs(self.log_dir, exist_ok=True)
         os.makedirs(os.path.join(self.log_dir, 'archive'), exist_ok=True)
 
+        # Agregaty minutowe i godzinowe w log_dir/rollups/, aktualizowane przy każdym odczycie
+        self.rollups = None
+        if self.config.get('rollups', True):
+            suffix = f".w{shard}" if shard is not None else ''
+            self.rollups = rollup.RollupWriter(os.path.join(self.log_dir, 'rollups'), suffix)
+
         self.current_file = None
-        self.writer = None
         self.buffer = []
         self.last_rotation_time = datetime.now()
         self.current_line_count = 0
         self.current_filename = ""
 
+        # Decyzje o rotacji opierają się na licznikach w pamięci (bajty, wiersze,
+        # termin rotacji), aktualizowanych przy flushu - bez syscalli na odczyt
+        self.current_size_bytes = 0
+        self._max_size_bytes = self.max_size_mb * 1024 * 1024
+        self._rotation_deadline = time.monotonic() + self.rotate_every_hours * 3600
+        self._flushes_since_stat = 0
+        self._last_flush = time.monotonic()
+
+        self._lock = threading.RLock()
+        self._flusher = None
+        self._flusher_stop = threading.Event()
+        self._archiver = None
+        self._archive_jobs = []
+
+        self._file_min = None
+        self._file_max = None
+        self._sensor_counts = {}
+        self._file_max_flushed = None
+
     def _get_log_filename(self, dt: Optional[datetime] = None):
         if not dt:
             dt = datetime.now()
         return os.path.join(self.log_dir, dt.strftime(self.filename_pattern))
 
     def start(self):
+        with self._lock:
+            self._open_file()
+
+        if self.flush_interval_ms and self._flusher is None:
+            self._flusher_stop.clear()
+            self._flusher = threading.Thread(target=self._flush_periodically, name="logger-flusher", daemon=True)
+            self._flusher.start()
+
+    def stop(self):
+        if self._flusher is not None:
+            self._flusher_stop.set()
+            self._flusher.join()
+            self._flusher = None
+
+        with self._lock:
+            self._close_file()
+            if self.rollups is not None:
+                self.rollups.flush(final=True)
+
+        # Zaległe archiwizacje kończą się przed zatrzymaniem, a wątek archiwizatora wygasa
+        self.wait_for_archives()
+        if self._archiver is not None:
+            self._archiver.shutdown(wait=True)
+            self._archiver = None
+
+    def wait_for_archives(self):
+        """Czeka na zakończenie archiwizacji zleconych w tle."""
+        jobs, self._archive_jobs = self._archive_jobs, []
+        wait(jobs)
+
+    def _open_file(self):
         self.current_filename = self._get_log_filename()
         is_new_file = not os.path.exists(self.current_filename) or os.path.getsize(self.current_filename) == 0
-        self.current_file = open(self.current_filename, mode='a', newline='', encoding='utf-8')
-        self.writer = csv.writer(self.current_file, delimiter=',')
+        if not is_new_file:
+            with open(self.current_filename, 'rb') as f:
+                existing_storage = detect_storage(f).name
+            if existing_storage != self.storage.name:
+                # Zmieniono format w konfiguracji - nie dopisujemy do pliku w innym formacie
+                print(f"[LOGGER] Plik {self.current_filename} ma format {existing_storage}, przenoszę do archiwum")
+                self._submit_archive(self._set_aside(self.current_filename))
+                is_new_file = True
+        self.current_file = open(self.current_filename, mode='ab')
         if is_new_file:
-            print("[LOGGER] Wpisywanie nagłówków CSV")
-            self.writer.writerow(["timestamp", "sensor_id", "value", "unit"])
+            print(f"[LOGGER] Wpisywanie nagłówka pliku ({self.storage.name})")
+            self.current_file.write(self.storage.header())
             self.current_file.flush()
 
-        # Count existing lines (excluding header)
-        with open(self.current_filename, 'r', encoding='utf-8') as f:
-            self.current_line_count = sum(1 for _ in f) - 1
+        # Count existing rows (excluding header)
+        with open(self.current_filename, 'rb') as f:
+            self.current_line_count = self.storage.count_rows(f)
+
+        meta = self._read_meta(self.current_filename)
+        if meta is None or meta['rows'] != self.current_line_count:
+            # Brak aktualnego sidecara - zakres czasu wyznaczamy skanując plik
+            meta = self._scan_meta(self.current_filename)
+        self._file_min = datetime.fromisoformat(meta['min']) if meta['min'] else None
+        self._file_max = datetime.fromisoformat(meta['max']) if meta['max'] else None
+        self._sensor_counts = dict(meta.get('sensors', {}))
+        self._file_max_flushed = self._file_max
 
+        self.current_size_bytes = os.path.getsize(self.current_filename)
+        self._flushes_since_stat = 0
         self.last_rotation_time = datetime.now()
+        self._rotation_deadline = time.monotonic() + self.rotate_every_hours * 3600
 
-    def stop(self):
+    def _close_file(self):
         self._flush()
         if self.current_file:
             self.current_file.close()
@@ -65,35 +213,148 @@ class Logger:
     def log_reading(self, timestamp,sensor_id, value, unit):
         if isinstance(timestamp, (float, int)):
             timestamp = datetime.fromtimestamp(timestamp)
+        timestamp = local_timestamp(timestamp)
+        # Wartość sprawdzana przed zmianą stanu - odrzucony odczyt nie może trafić do bufora
+        value = float(value)
 
-        self.buffer.append([timestamp.isoformat(), sensor_id, value, unit])
+        with self._lock:
+            self.buffer.append((timestamp, sensor_id, value, unit))
+            if self.rollups is not None:
+                self.rollups.add(timestamp, sensor_id, value, unit)
+            self._sensor_counts[sensor_id] = self._sensor_counts.get(sensor_id, 0) + 1
+            if self._file_min is None or timestamp < self._file_min:
+                self._file_min = timestamp
+            if self._file_max is None or timestamp > self._file_max:
+                self._file_max = timestamp
 
-        if len(self.buffer) >= self.buffer_size:
-            print(f"[LOGGER] Buffor: {len(self.buffer)} osiągnięty, nastąpi flush")
-            self._flush()
+            if len(self.buffer) >= self.buffer_size:
+                print(f"[LOGGER] Buffor: {len(self.buffer)} osiągnięty, nastąpi flush")
+                self._flush()
 
-        if self._rotation_needed():
-            print("[LOGGER] Rotuję")
-            self._rotate()
+            if self._rotation_needed():
+                print("[LOGGER] Rotuję")
+                self._rotate()
+
+    def _flush_periodically(self):
+        # Wątek budzi się, gdy od ostatniego zapisu (także wywołanego przez
+        # buffer_size) minie flush_interval_ms - nie w stałym rytmie zegara
+        interval = self.flush_interval_ms / 1000
+        timeout = interval
+        while not self._flusher_stop.wait(timeout):
+            with self._lock:
+                elapsed = time.monotonic() - self._last_flush
+                if elapsed >= interval:
+                    self._flush()
+                    elapsed = 0
+            timeout = interval - elapsed
 
     def _flush(self):
-        if self.writer and self.buffer:
-            self.writer.writerows(self.buffer)
+        if self.current_file and self.buffer:
+            data, index_entries = self._encode_indexed()
+            self.current_file.write(data)
+            self.current_size_bytes += len(data)
             self.current_line_count += len(self.buffer)
             print(f"[LOGGER] Zrobiono flush")
             self.buffer = []
+            self._last_flush = time.monotonic()
             self.current_file.flush()
+            if self.fsync == 'flush':
+                os.fsync(self.current_file.fileno())
+            if index_entries:
+                with open(self.current_filename + INDEX_SUFFIX, 'a', encoding='utf-8') as f:
+                    f.writelines(f"{ts.isoformat()},{offset}\n" for ts, offset in index_entries)
+            self._write_meta()
+            if self.rollups is not None:
+                self.rollups.flush()
+
+            self._flushes_since_stat += 1
+            if self.stat_every_flushes and self._flushes_since_stat >= self.stat_every_flushes:
+                self._sync_file_size()
+
+    def _encode_indexed(self):
+        """
+        Koduje bufor i wyznacza wpisy indeksu dla co index_every_rows-tego wiersza.
+        Wpis to (największy znacznik czasu we wszystkich wcześniejszych wierszach,
+        offset wiersza), więc wszystkie wiersze przed offsetem są starsze od tego
+        znacznika - nawet gdy odczyty różnych klientów są lekko nieuporządkowane.
+        """
+        every = self.index_every_rows
+        if not every:
+            return self.storage.encode(self.buffer), []
+
+        chunks = []
+        index_entries = []
+        offset = self.current_size_bytes
+        prefix_max = self._file_max_flushed
+        start = 0
+        boundary = (-self.current_line_count) % every
+        while start < len(self.buffer):
+            end = min(boundary, len(self.buffer))
+            if end > start:
+                chunk = self.storage.encode(self.buffer[start:end])
+                chunks.append(chunk)
+                offset += len(chunk)
+                chunk_max = max(row[0] for row in self.buffer[start:end])
+                prefix_max = chunk_max if prefix_max is None else max(prefix_max, chunk_max)
+            if boundary < len(self.buffer) and prefix_max is not None:
+                index_entries.append((prefix_max, offset))
+            start = end
+            boundary += every
+        self._file_max_flushed = prefix_max
+        return b"".join(chunks), index_entries
+
+    def _write_meta(self):
+        meta = {
+            'min': self._file_min.isoformat() if self._file_min else None,
+            'max': self._file_max.isoformat() if self._file_max else None,
+            'rows': self.current_line_count,
+            'sensors': self._sensor_counts,
+        }
+        meta_path = self.current_filename + META_SUFFIX
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    @staticmethod
+    def _read_meta(file_path: str) -> Optional[Dict]:
+        try:
+            with open(file_path + META_SUFFIX, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _scan_meta(self, file_path: str) -> Dict:
+        file_min = file_max = None
+        rows = 0
+        sensors = {}
+        for timestamp, sensor, _, _ in self._iter_rows(file_path):
+            rows += 1
+            sensors[sensor] = sensors.get(sensor, 0) + 1
+            if file_min is None or timestamp < file_min:
+                file_min = timestamp
+            if file_max is None or timestamp > file_max:
+                file_max = timestamp
+        return {
+            'min': file_min.isoformat() if file_min else None,
+            'max': file_max.isoformat() if file_max else None,
+            'rows': rows,
+            'sensors': sensors,
+        }
+
+    def _sync_file_size(self):
+        # Okresowa korekta licznika, gdyby plik był modyfikowany poza loggerem
+        if os.path.exists(self.current_filename):
+            self.current_size_bytes = os.path.getsize(self.current_filename)
+        self._flushes_since_stat = 0
 
     def _rotation_needed(self):
-        if (datetime.now() - self.last_rotation_time) >= timedelta(hours=self.rotate_every_hours):
+        if time.monotonic() >= self._rotation_deadline:
             print("[LOGGER] Niedługo rotacja przez czas")
             return True
 
-        if os.path.exists(self.current_filename):
-            size_mb = os.path.getsize(self.current_filename) / (1024 * 1024)
-            if size_mb >= self.max_size_mb:
-                print("[LOGGER] Niedługo rotacja wielkosc pliku")
-                return True
+        if self.current_size_bytes >= self._max_size_bytes:
+            print("[LOGGER] Niedługo rotacja wielkosc pliku")
+            return True
 
         if self.rotate_after_lines and self.current_line_count >= self.rotate_after_lines:
             print("[LOGGER] Niedługo rotacja przez ilość rzędów")
@@ -102,31 +363,325 @@ class Logger:
         return False
 
     def _rotate(self):
-        self.stop()
-        self._archive(self.current_filename)
-        self._old_archive_delete()
-        self.start()
+        # Zamknięty plik jest tylko przenoszony do archive/, a nowy plik otwiera się
+        # od razu - kompresja i czyszczenie starych archiwów odbywają się w tle
+        self._close_file()
+        pending_path = self._set_aside(self.current_filename)
+        self._open_file()
+        self._submit_archive(pending_path)
+
+    def _set_aside(self, file_path: str) -> str:
+        """Przenosi plik logu (z sidecarami) do archive/ i zwraca jego nową ścieżkę."""
+        pending_path = self._pending_archive_path(file_path)
+        os.replace(file_path, pending_path)
+        self._move_sidecars(file_path, pending_path)
+        return pending_path
+
+    def _submit_archive(self, pending_path: str):
+        if self.archive_in_background:
+            if self._archiver is None:
+                self._archiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="logger-archiver")
+            self._archive_jobs = [job for job in self._archive_jobs if not job.done()]
+            self._archive_jobs.append(self._archiver.submit(self._archive_and_cleanup, pending_path))
+        else:
+            self._archive_and_cleanup(pending_path)
+
+    def _pending_archive_path(self, file_path: str):
+        # Kolejne rotacje tego samego dnia nie mogą nadpisać wcześniejszych archiwów
+        archive_dir = os.path.join(self.log_dir, 'archive')
+        file_name = os.path.basename(file_path)
+        candidate = os.path.join(archive_dir, file_name)
+        n = 1
+        while os.path.exists(candidate) or any(os.path.exists(candidate + suffix)
+                                               for suffix in ARCHIVE_FORMATS.values()):
+            candidate = os.path.join(archive_dir, f"{file_name}.{n}")
+            n += 1
+        return candidate
+
+    @staticmethod
+    def _move_sidecars(src_path: str, dst_path: str):
+        for suffix in SIDECAR_SUFFIXES:
+            if os.path.exists(src_path + suffix):
+                os.replace(src_path + suffix, dst_path + suffix)
+
+    def _archive_and_cleanup(self, file_path: str):
+        try:
+            self._archive(file_path)
+            self._old_archive_delete()
+        except Exception as e:
+            print(f"[LOGGER] Błąd archiwizacji {file_path}: {e}")
 
     def _archive(self, file_path: str):
         file_name = os.path.basename(file_path)
-        archive_path = os.path.join(self.log_dir, 'archive', file_name + '.zip')
+        archive_path = os.path.join(self.log_dir, 'archive', file_name + ARCHIVE_FORMATS[self.archive_format])
+        tmp_path = archive_path + '.tmp'
 
-        with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(file_path, arcname=file_name)
+        if self.archive_format == 'tsz':
+            with open(tmp_path, 'wb') as f:
+                gorilla.write_archive(self._iter_rows(file_path), f)
+        else:
+            with zipfile.ZipFile(tmp_path, 'w', ARCHIVE_CODECS[self.archive_codec],
+                                 compresslevel=self.archive_compresslevel) as zipf:
+                zipf.write(file_path, arcname=file_name)
+        os.replace(tmp_path, archive_path)
+        self._move_sidecars(file_path, archive_path)
+        if self.archive_format == 'tsz' and os.path.exists(archive_path + INDEX_SUFFIX):
+            os.remove(archive_path + INDEX_SUFFIX)  # offsety indeksu dotyczą tylko pliku źródłowego
         print(f"[LOGGER] Zarchiwizowano w:{archive_path}")
 
         os.remove(file_path)
 
     def _old_archive_delete(self):
+        self._delete_expired(os.path.join(self.log_dir, 'archive'), "archiwum")
+        # Agregaty z log_dir/rollups/ podlegają tej samej retencji co archiwa; po usunięciu
+        # pliku jego okres jest liczony z surowych odczytów, więc pokrycie tieru się przesuwa
+        rollups_dir = os.path.join(self.log_dir, 'rollups')
+        for file_name in self._delete_expired(rollups_dir, "agregat", keep=(rollup.COVERAGE_FILE,)):
+            rollup.mark_pruned(rollups_dir, file_name)
+
+    def _delete_expired(self, directory: str, kind: str, keep=()) -> List[str]:
+        """Usuwa pliki starsze niż retention_days (z sidecarami) i zwraca nazwy usuniętych."""
+        deleted = []
+        if not os.path.isdir(directory):
+            return deleted
         current_time = datetime.now()
-        archive_dir = os.path.join(self.log_dir, 'archive')
 
-        for file_name in os.listdir(archive_dir):
-            file_path = os.path.join(archive_dir, file_name)
+        for file_name in os.listdir(directory):
+            if file_name.endswith(SIDECAR_SUFFIXES) or file_name in keep:
+                continue  # sidecary są usuwane razem ze swoim archiwum
+            file_path = os.path.join(directory, file_name)
             if os.path.isfile(file_path):
                 file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
                 if (current_time - file_time).days > self.retention_days:
-                    os.remove(file_path)
-                    print(f"[LOGGER] Usunięto stare archiwum: {file_name}")
+                    try:
+                        os.remove(file_path)
+                        for suffix in SIDECAR_SUFFIXES:
+                            if os.path.exists(file_path + suffix):
+                                os.remove(file_path + suffix)
+                    except FileNotFoundError:
+                        continue  # usunięte w tym czasie przez logger innego procesu (shardu)
+                    print(f"[LOGGER] Usunięto stare {kind}: {file_name}")
+                    deleted.append(file_name)
+        return deleted
+
+    def read_logs(self, start: datetime, end: datetime, sensor_id: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Strumieniowo zwraca wpisy z zakresu [start, end] z plików bieżących
+        i archiwów ZIP (bez rozpakowywania na dysk). Pliki, których zakres czasu
+        (z sidecara, a w jego braku z daty w nazwie) nie pokrywa się z zapytaniem,
+        są pomijane bez otwierania. Początek zakresu w pliku jest wyszukiwany
+        binarnie w rzadkim indeksie, a odczyt zaczyna się od wskazanego offsetu.
+        """
+        start, end = local_timestamp(start), local_timestamp(end)
+        for file_path, offset in self.log_files(start, end, sensor_id):
+            for timestamp, sensor, value, unit in self._iter_rows(file_path, offset):
+                if sensor_id is not None and sensor != sensor_id:
+                    continue
+                timestamp = local_timestamp(timestamp)  # pliki zapisane przed normalizacją
+                if start <= timestamp <= end:
+                    yield {
+                        "timestamp": timestamp,
+                        "sensor_id": sensor,
+                        "value": value,
+                        "unit": unit
+                    }
+
+    def read_aggregates(self, start: datetime, end: datetime, resolution: timedelta,
+                        sensor_id: Optional[str] = None) -> List[Dict]:
+        """
+        Zwraca agregaty (count, sum, mean, min, max, last) per czujnik w przedziałach
+        o szerokości resolution. Dane pochodzą z najgrubszego tieru agregatów, którego
+        przedziały składają się na resolution (1 h, potem 1 min) - wtedy uwzględniane są
+        przedziały tieru zawarte w [start, end]. Część zakresu, której tier nie pokrywa
+        (dane sprzed włączenia agregatów lub z usuniętych plików), jest liczona
+        z surowych odczytów, podobnie jak drobniejsze rozdzielczości (lub brak agregatów).
+        """
+        start, end = local_timestamp(start), local_timestamp(end)
+        tier = rollup.select_tier(resolution) if self.rollups is not None else None
+        covered_from = rollup.read_coverage(self.rollups.directory).get(tier[0]) if tier else None
+        if covered_from is None or covered_from > end:
+            return rollup.aggregate_readings(self.read_logs(start, end, sensor_id), resolution)
+        raw = None
+        if covered_from > start:
+            raw_end = covered_from - timedelta(microseconds=1)
+            raw = rollup.aggregate_buckets(self.read_logs(start, raw_end, sensor_id), tier[1])
+        with self._lock:
+            pending = self.rollups.pending(tier[0])
+        return rollup.read_tier(self.rollups.directory, tier, start, end, resolution, sensor_id, pending,
+                                covered_from, raw)
+
+    def log_files(self, start: datetime, end: datetime, sensor_id: Optional[str] = None):
+        """
+        Zwraca pary (ścieżka, offset) plików logów, które mogą zawierać wpisy
+        z zakresu [start, end]; offset wskazuje miejsce w pliku, od którego
+        warto czytać (wg rzadkiego indeksu). Wcześniej zapisuje bufor na dysk.
+        """
+        start, end = local_timestamp(start), local_timestamp(end)
+        with self._lock:
+            self._flush()
+        return [(file_path, self._index_offset(file_path, start))
+                for file_path, file_date in self._log_files()
+                if self._file_overlaps(file_path, file_date, start, end, sensor_id)]
+
+    def _file_date(self, file_name: str) -> Optional[datetime]:
+        try:
+            return datetime.strptime(file_name[:self._pattern_length], self.filename_pattern)
+        except ValueError:
+            return None
+
+    def _log_files(self):
+        """Zwraca pary (ścieżka, data z nazwy) plików logów: najpierw archiwa, potem bieżące."""
+        files = []
+        archive_dir = os.path.join(self.log_dir, 'archive')
+        for directory, kind in ((archive_dir, 0), (self.log_dir, 1)):
+            for file_name in os.listdir(directory):
+                if file_name.endswith(SIDECAR_SUFFIXES + ('.tmp',)):
+                    continue
+                file_path = os.path.join(directory, file_name)
+                file_date = self._file_date(file_name)
+                if file_date is None or not os.path.isfile(file_path):
+                    continue
+                if kind == 1 and len(file_name) != self._pattern_length:
+                    continue
+                # Kolejne rotacje z jednego dnia: name.zip, name.1.zip, name.2.zip...
+                suffix = file_name[self._pattern_length:].split('.')
+                sequence = int(suffix[1]) if len(suffix) > 1 and suffix[1].isdigit() else 0
+                files.append((file_date, kind, sequence, file_path))
+        return [(file_path, file_date) for file_date, _, _, file_path in sorted(files)]
+
+    def shards(self):
+        """Zwraca numery shardów, dla których istnieją pliki logów (bieżące lub archiwa)."""
+        root, ext = os.path.splitext(self._base_pattern)
+        prefix_length = len(datetime(2000, 1, 1).strftime(root))
+        shard_suffix = re.compile(r'\.w(\d+)' + re.escape(ext))
+        shards = set()
+        for directory in (self.log_dir, os.path.join(self.log_dir, 'archive')):
+            for file_name in os.listdir(directory):
+                match = shard_suffix.match(file_name, prefix_length)
+                if match is None:
+                    continue
+                try:
+                    datetime.strptime(file_name[:prefix_length], root)
+                except ValueError:
+                    continue
+                shards.add(int(match.group(1)))
+        return sorted(shards)
+
+    def _file_overlaps(self, file_path: str, file_date: datetime, start: datetime, end: datetime,
+                       sensor_id: Optional[str] = None) -> bool:
+        meta = self._read_meta(file_path)
+        if meta is not None:
+            if meta['min'] is None:
+                return False
+            if sensor_id is not None and 'sensors' in meta and sensor_id not in meta['sensors']:
+                return False
+            return datetime.fromisoformat(meta['min']) <= end and datetime.fromisoformat(meta['max']) >= start
+        # Bez sidecara: plik założony po końcu zakresu nie zawiera szukanych wpisów
+        return file_date.date() <= end.date()
+
+    @staticmethod
+    def _index_offset(file_path: str, start: datetime) -> int:
+        """Offset ostatniego wpisu indeksu, przed którym wszystkie wiersze są starsze niż start."""
+        timestamps = []
+        offsets = []
+        try:
+            with open(file_path + INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+                for line in f:
+                    ts, _, offset = line.rstrip('\n').rpartition(',')
+                    timestamps.append(datetime.fromisoformat(ts))
+                    offsets.append(int(offset))
+        except (OSError, ValueError):
+            return 0
+
+        # Znaczniki w indeksie są niemalejące (maksimum prefiksu), więc działa bisekcja
+        position = bisect_left(timestamps, start)
+        return offsets[position - 1] if position > 0 else 0
+
+    def _iter_rows(self, file_path: str, offset: int = 0):
+        """Zwraca krotki (timestamp, sensor_id, value, unit); format pliku jest rozpoznawany po nagłówku."""
+        try:
+            if file_path.endswith(gorilla.SUFFIX):
+                # Archiwum szeregów czasowych nie ma offsetów wierszy - dekodowane jest w całości
+                with open(file_path, 'rb') as raw:
+                    yield from gorilla.iter_archive(raw)
+            elif file_path.endswith('.zip'):
+                with zipfile.ZipFile(file_path) as zipf:
+                    members = zipf.namelist()
+                    for member in members:
+                        with zipf.open(member) as raw:
+                            yield from detect_storage(raw).iter_rows(raw, offset if len(members) == 1 else 0)
+            else:
+                with open(file_path, 'rb') as raw:
+                    yield from detect_storage(raw).iter_rows(raw, offset)
+        except FileNotFoundError:
+            # Plik mógł zostać właśnie skompresowany przez archiwizację w tle
+            for suffix in ARCHIVE_FORMATS.values():
+                if not file_path.endswith(suffix) and os.path.exists(file_path + suffix):
+                    yield from self._iter_rows(file_path + suffix, offset)
+                    break
+
+
+def read_merged_logs(config_path: str, start: datetime, end: datetime,
+                     sensor_id: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Odczyt logów serwera wieloprocesowego: łączy wpisy z pliku bez shardu
+    i ze wszystkich shardów (sensors_%Y%m%d.w{n}.csv) w jeden strumień
+    uporządkowany po znaczniku czasu (heapq.merge, bez wczytywania całości).
+    """
+    base = Logger(config_path)
+    loggers = [base] + [Logger(config_path, shard=shard) for shard in base.shards()]
+    return heapq.merge(*(logger.read_logs(start, end, sensor_id) for logger in loggers),
+                       key=lambda entry: entry['timestamp'])
+
+
+class LoggerPipeline:
+    """
+    Wspólny potok logowania dla wielu wątków: odczyty trafiają do kolejki,
+    a jeden wątek zapisujący przekazuje je do jednego Loggera. Dzięki temu
+    zapisy są uporządkowane, buforowane raz, a rotacja odbywa się tylko raz.
+    Cyklem życia samego Loggera (start/stop) zarządza właściciel potoku.
+    """
+
+    _STOP = object()
+
+    def __init__(self, logger: Logger, max_queue_size: int = 0):
+        self.logger = logger
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        # Po zatrzymaniu potoku nikt nie odbiera kolejki - odczyt nie może już do niej trafić
+        self._stopped = False
+        self._state_lock = threading.Lock()
+
+    def start(self):
+        with self._state_lock:
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="logger-pipeline", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Zapisuje wszystkie oczekujące odczyty i zatrzymuje wątek zapisujący."""
+        with self._state_lock:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self.queue.put(self._STOP)
+        if thread is not None:
+            thread.join()
 
+    def log_reading(self, timestamp, sensor_id, value, unit):
+        """Przekazuje odczyt do wątku zapisującego; po stop() zgłasza RuntimeError."""
+        with self._state_lock:
+            if self._stopped:
+                raise RuntimeError("Potok logowania jest zatrzymany")
+            self.queue.put((timestamp, sensor_id, value, unit))
 
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                break
+            try:
+                self.logger.log_reading(*item)
+            except Exception as e:
+                print(f"[LOGGER] Błąd zapisu odczytu: {e}")
@@ -1,12 +1,16 @@
 import socket
 import json
 import logging
+import random
 import sys
 import threading
+from collections import deque
 
 import yaml
 import time
 from datetime import datetime
+from network.protocol import HELLO, HELLO_ACK, BinaryEncoder, parse_reply
+from network.spool import Spool
 from AirQualitySensor import AirQualitySensor
 from HumiditySensor import HumiditySensor
 from PressureSensor import PressureSensor
@@ -14,6 +18,59 @@ from TemperatureSensor import TemperatureSensor
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(message)s', stream=sys.stdout)
 
+
+class CircuitOpenError(ConnectionError):
+    """Wysyłka pominięta, bo wyłącznik obwodu uznaje serwer za niedostępny."""
+
+
+class CircuitBreaker:
+    """
+    Wyłącznik obwodu dla połączeń z serwerem. Po failure_threshold kolejnych
+    błędach przechodzi w stan "open" i przez reset_timeout sekund odrzuca wysyłki
+    bez łączenia się z serwerem. Potem przepuszcza jedną próbę ("half_open"):
+    sukces zamyka obwód, a błąd otwiera go ponownie.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Zwraca True, jeśli można teraz spróbować połączyć się z serwerem."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info("[CLIENT] Serwer znów dostępny, zamknięto obwód")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.failure_threshold and self.failures >= self.failure_threshold):
+                if self.state != self.OPEN:
+                    logging.warning(f"[CLIENT] Otwarto obwód po {self.failures} błędach, "
+                                    f"wysyłki wstrzymane na {self.reset_timeout}s")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
 class NetworkClient:
     def __init__(self, config_path="../config.yaml"):
         try:
@@ -28,44 +85,367 @@ class NetworkClient:
         self.port = client_cfg.get("port", 9000)
         self.timeout = client_cfg.get("timeout", 5.0)
         self.retries = client_cfg.get("retries", 3)
+        # Tryb stałego połączenia: jedno gniazdo TCP dla wielu odczytów
+        self.persistent = client_cfg.get("persistent", False)
+        # Maksymalna liczba wiadomości wysyłanych jednym pakietem w send_batch
+        self.batch_size = client_cfg.get("batch_size", 100)
+        # Format wiadomości: "json" (linie JSON) lub "binary" (ramki SBP1, jeśli serwer je obsługuje)
+        self.protocol = client_cfg.get("protocol", "json")
+        # Kolejka wychodząca (QueuedSender): rozmiar i polityka przepełnienia
+        self.queue_size = client_cfg.get("queue_size", 10000)
+        self.backpressure = client_cfg.get("backpressure", "drop_oldest")
+        # Bufor dyskowy niewysłanych odczytów i tempo ich ponownej wysyłki (odczyty/s)
+        self.spool_dir = client_cfg.get("spool_dir")
+        self.spool_max_mb = client_cfg.get("spool_max_mb", 64)
+        self.replay_rate = client_cfg.get("replay_rate", 500)
+        self.replay_retry_interval = client_cfg.get("replay_retry_interval", 5.0)
+        # Wykładnicze opóźnienie między próbami (z losowym rozrzutem) i wyłącznik obwodu
+        self.backoff_base = client_cfg.get("backoff_base", 0.1)
+        self.backoff_max = client_cfg.get("backoff_max", 5.0)
+        self.breaker = CircuitBreaker(client_cfg.get("breaker_threshold", 5),
+                                      client_cfg.get("breaker_reset_timeout", 10.0))
 
-    def send_sensor_data(self, sensor_id, value, unit, timestamp):
+        self.spool = None
+        if self.spool_dir:
+            self.spool = Spool(self.spool_dir, max_total_bytes=int(self.spool_max_mb * 1024 * 1024))
+        self._replay_thread = None
+        # Odczyty odrzucone przez serwer (NAK) - nie są ponawiane ani buforowane
+        self.rejected = 0
+
+        self._sock = None
+        self._recv_buffer = b""
+        self._encoder = None
+        self._lock = threading.Lock()
+
+    def _open_socket(self):
+        logging.info(f"[CLIENT] Łączenie z: {self.host}:{self.port}")
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.settimeout(self.timeout)
+        self._recv_buffer = b""
+        self._encoder = None
+        if self.protocol == "binary":
+            try:
+                self._negotiate(sock)
+            except Exception:
+                sock.close()
+                raise
+        return sock
+
+    def _negotiate(self, sock):
+        """
+        Proponuje serwerowi protokół binarny SBP1. Słowniki sensorów i jednostek
+        są osobne dla każdego połączenia, więc nowe połączenie dostaje nowy koder.
+        Serwer bez obsługi SBP1 nie odpowie HELLO_ACK - wtedy zostajemy przy JSON.
+        """
+        sock.sendall(HELLO)
+        try:
+            reply = self._read_line(sock)
+        except socket.timeout:
+            reply = b"brak odpowiedzi"  # starszy serwer odrzuca powitanie bez odpowiedzi
+        if reply + b"\n" == HELLO_ACK:
+            self._encoder = BinaryEncoder()
+        else:
+            logging.warning(f"[CLIENT] Serwer nie obsługuje protokołu binarnego ({reply}), używam JSON")
+
+    def connect(self):
+        """Nawiązuje stałe połączenie z serwerem (jeśli jeszcze nie istnieje)."""
+        if self._sock is None:
+            self._sock = self._open_socket()
+            logging.info(f"[CLIENT] Połączono z: {self.host}:{self.port}")
+        return self._sock
+
+    def close(self):
+        """Zamyka stałe połączenie z serwerem."""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+            self._recv_buffer = b""
+            self._encoder = None
+            logging.info("[CLIENT] Zamknięto połączenie")
+
+    @staticmethod
+    def _encode(sensor_id, value, unit, timestamp):
         message_dict = {
             "sensor_id": sensor_id,
             "value": value,
             "unit": unit,
             "timestamp": timestamp.isoformat()
         }
-        message = (json.dumps(message_dict) + "\n").encode('utf-8')
+        return (json.dumps(message_dict) + "\n").encode('utf-8')
 
-        for attempt in range(1, self.retries + 1):
-            try:
-                logging.info(f"[CLIENT] Łączenie z: {self.host}:{self.port}")
-                with socket.create_connection((self.host, self.port), timeout=self.timeout) as sock:
-                    logging.info(f"[CLIENT] Połączono z: {self.host}:{self.port}")
+    def _encode_readings(self, readings):
+        """Koduje odczyty w formacie wynegocjowanym dla bieżącego połączenia."""
+        if self._encoder is not None:
+            return b"".join(self._encoder.encode(*reading) for reading in readings)
+        return b"".join(self._encode(*reading) for reading in readings)
 
-                    sock.sendall(message)
-                    logging.info(f"[CLIENT] Wysłano dane:: {message_dict}")
+    def _read_line(self, sock):
+        while b"\n" not in self._recv_buffer:
+            data = sock.recv(4096)
+            if not data:
+                raise ConnectionError("Serwer zamknął połączenie")
+            self._recv_buffer += data
+        line, self._recv_buffer = self._recv_buffer.split(b"\n", 1)
+        return line
 
-                    sock.settimeout(self.timeout)
-                    ack = sock.recv(1024)
-
-                    if ack.strip() == b'ACK':
-                        logging.info("[CLIENT] Przyjęto ACK i wysłano dane.")
-                        return True
-                    else:
-                        logging.warning(f"[CLIENT] Nieoczekiwany błąd ACK: {ack}")
+    def _transmit(self, readings):
+        """
+        Wysyła odczyty jednym wywołaniem sendall i odbiera potwierdzenia.
+        W trybie stałym używa istniejącego połączenia, a po błędzie je zamyka,
+        dzięki czemu następna próba połączy się ponownie.
 
+        :return: krotka (liczba wiadomości, na które serwer odpowiedział, w tym
+                 odrzuconych; liczba odrzuconych (NAK); błąd lub None)
+        """
+        answered = 0
+        rejected = 0
+        if not self.breaker.allow():
+            return answered, rejected, CircuitOpenError("Serwer niedostępny (otwarty obwód)")
+        with self._lock:
+            try:
+                sock = self.connect() if self.persistent else self._open_socket()
+                try:
+                    sock.sendall(self._encode_readings(readings))
+                    # Serwer odpowiada po kolei pojedynczo ("ACK"/"NAK") lub zbiorczo ("ACK n"/"NAK n")
+                    while answered < len(readings):
+                        accepted, refused = parse_reply(self._read_line(sock))
+                        answered = min(len(readings), answered + accepted + refused)
+                        rejected += refused
+                finally:
+                    if not self.persistent:
+                        sock.close()
+                        logging.info("[CLIENT] Zamknięto połączenie")
             except socket.timeout:
-                logging.error(f"[CLIENT] Próba {attempt} nie powiodła się: timed out")
+                self.close()
+                self.breaker.record_failure()
+                return answered, rejected, "timed out"
             except Exception as e:
-                logging.error(f"[CLIENT] Próba {attempt} nie powiodła się: {e}")
+                self.close()
+                self.breaker.record_failure()
+                return answered, rejected, e
+        self.breaker.record_success()
+        return answered, rejected, None
 
-            logging.info("[CLIENT] Zamknięto połączenie")
+    def _backoff(self, attempt):
+        """
+        Czeka przed kolejną próbą: losowo od 0 do backoff_base * 2^(attempt-1)
+        (najwyżej backoff_max). Rozrzut sprawia, że klienci nie łączą się
+        z restartowanym serwerem w tej samej chwili.
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        time.sleep(random.uniform(0, delay))
+
+    def send_sensor_data(self, sensor_id, value, unit, timestamp):
+        reading = (sensor_id, value, unit, timestamp)
 
-        logging.error(f"[CLIENT] Nie udało się wyslać danych po {self.retries} próbach (sensor_id={sensor_id})")
+        for attempt in range(1, self.retries + 1):
+            answered, rejected, error = self._transmit([reading])
+            if rejected:
+                # Ponowna wysyłka zostałaby odrzucona tak samo - odczyt nie trafia do bufora
+                logging.error(f"[CLIENT] Serwer odrzucił odczyt (sensor_id={sensor_id})")
+                self.rejected += 1
+                return False
+            if answered:
+                logging.info(f"[CLIENT] Przyjęto ACK i wysłano dane (sensor_id={sensor_id}).")
+                self._start_replay()
+                return True
+            if isinstance(error, CircuitOpenError):
+                logging.warning(f"[CLIENT] Obwód otwarty, pomijam wysyłkę (sensor_id={sensor_id})")
+                break
+            logging.error(f"[CLIENT] Próba {attempt} nie powiodła się: {error}")
+            if attempt < self.retries:
+                self._backoff(attempt)
+        else:
+            logging.error(f"[CLIENT] Nie udało się wyslać danych po {self.retries} próbach (sensor_id={sensor_id})")
+
+        self.spool_readings([(sensor_id, value, unit, timestamp)])
         return False
 
+    def send_batch(self, readings):
+        """
+        Wysyła wiele odczytów potokowo: paczka wiadomości (linie JSON lub ramki SBP1)
+        trafia do serwera jednym zapisem, a potwierdzenia ACK są zbierane zbiorczo.
+        Po błędzie wysyłane są ponownie tylko odczyty, na które serwer nie odpowiedział;
+        odczyty odrzucone przez serwer (NAK) nie są ponawiane.
+
+        :param readings: kolekcja krotek (sensor_id, value, unit, timestamp)
+        :return: liczba odczytów przyjętych przez serwer
+        """
+        readings = list(readings)
+        sent, rejected = self._send_readings(readings)
+        if sent < len(readings):
+            self.spool_readings(readings[sent:])
+        elif readings:
+            self._start_replay()
+        return sent - rejected
+
+    def _send_readings(self, readings):
+        """
+        :return: krotka (liczba odczytów od początku listy, na które serwer odpowiedział;
+                 liczba odczytów spośród nich odrzuconych)
+        """
+        sent = 0
+        rejected = 0
+        attempt = 0
+
+        while sent < len(readings):
+            chunk = readings[sent:sent + self.batch_size]
+            answered, refused, error = self._transmit(chunk)
+            sent += answered
+            rejected += refused
+            if error is None:
+                attempt = 0
+                continue
+
+            if isinstance(error, CircuitOpenError):
+                logging.warning(f"[CLIENT] Obwód otwarty, pomijam wysyłkę {len(readings) - sent} z {len(readings)} odczytów")
+                break
+            attempt += 1
+            logging.error(f"[CLIENT] Próba {attempt} nie powiodła się: {error}")
+            if attempt >= self.retries:
+                logging.error(f"[CLIENT] Nie udało się wysłać {len(readings) - sent} z {len(readings)} odczytów po {attempt} próbach")
+                break
+            self._backoff(attempt)
+
+        if rejected:
+            self.rejected += rejected
+            logging.error(f"[CLIENT] Serwer odrzucił {rejected} z {len(readings)} odczytów")
+        logging.info(f"[CLIENT] Potwierdzono {sent - rejected}/{len(readings)} odczytów")
+        return sent, rejected
+
+    def spool_readings(self, readings):
+        """Zapisuje niewysłane odczyty w buforze dyskowym (jeśli skonfigurowano spool_dir)."""
+        if self.spool is None or not readings:
+            return False
+        self.spool.append(readings)
+        logging.info(f"[CLIENT] Zapisano {len(readings)} odczytów w buforze dyskowym")
+        self._start_replay()
+        return True
+
+    def _start_replay(self):
+        if self.spool is None or (self._replay_thread is not None and self._replay_thread.is_alive()):
+            return
+        if self.spool.is_empty():
+            return
+        self._replay_thread = threading.Thread(target=self._replay_spool, name="spool-replay", daemon=True)
+        self._replay_thread.start()
+
+    def _replay_spool(self):
+        """
+        Wysyła zaległe odczyty z bufora dyskowego paczkami, w kolejności zapisu,
+        z ograniczeniem tempa replay_rate, żeby nie przeciążyć serwera po awarii.
+        """
+        try:
+            while not self.spool.is_empty():
+                records = self.spool.read(self.batch_size)
+                if not records:
+                    break
+                started = time.monotonic()
+                sent, _ = self._send_readings([reading for reading, _ in records])
+                if sent:
+                    self.spool.commit(records[sent - 1][1])
+                    logging.info(f"[CLIENT] Wysłano ponownie {sent} odczytów z bufora dyskowego")
+                if sent < len(records):
+                    time.sleep(self.replay_retry_interval)  # serwer nadal niedostępny
+                elif self.replay_rate:
+                    time.sleep(max(0.0, started + sent / self.replay_rate - time.monotonic()))
+        except OSError as e:
+            logging.error(f"[CLIENT] Błąd bufora dyskowego: {e}")
+
+
+class QueuedSender:
+    """
+    Kolejka wychodząca z wątkiem wysyłającym. send_sensor_data tylko dodaje odczyt
+    do kolejki, więc opóźnienia i awarie sieci nie wpływają na rytm próbkowania.
+    Wątek wysyłający przekazuje zebrane odczyty paczkami do NetworkClient.send_batch.
+
+    Polityka przepełnienia (backpressure):
+      - "block": czeka na miejsce w kolejce (najwyżej block_timeout sekund),
+      - "drop_oldest": usuwa najstarszy odczyt z kolejki,
+      - "spill": zapisuje odczyt w buforze dyskowym klienta (wymaga spool_dir),
+        skąd zostanie wysłany ponownie, gdy serwer będzie dostępny.
+    """
+
+    POLICIES = ("block", "drop_oldest", "spill")
+
+    def __init__(self, client, max_size=None, policy=None, block_timeout=None):
+        self.client = client
+        self.max_size = max_size or client.queue_size
+        self.policy = policy or client.backpressure
+        self.block_timeout = block_timeout
+        if self.policy not in self.POLICIES:
+            raise ValueError(f"Nieznana polityka kolejki: {self.policy}")
+        if self.policy == "spill" and client.spool is None:
+            raise ValueError("Polityka spill wymaga bufora dyskowego (client.spool_dir)")
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.dropped = 0
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="queued-sender", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Wysyła pozostałe odczyty z kolejki i zatrzymuje wątek wysyłający."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def send_sensor_data(self, sensor_id, value, unit, timestamp):
+        """Dodaje odczyt do kolejki; zwraca False tylko, gdy odczyt nie został przyjęty."""
+        reading = (sensor_id, value, unit, timestamp)
+        with self._condition:
+            if len(self._queue) >= self.max_size:
+                if self.policy == "block":
+                    if not self._condition.wait_for(lambda: len(self._queue) < self.max_size,
+                                                    timeout=self.block_timeout):
+                        self.dropped += 1
+                        return False
+                elif self.policy == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    return self.client.spool_readings([reading])
+            self._queue.append(reading)
+            self._condition.notify_all()
+        return True
+
+    def pending(self):
+        with self._condition:
+            return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or not self._running, timeout=1.0)
+                if not self._queue and not self._running:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.client.batch_size))]
+                self._condition.notify_all()
+
+            if not batch:
+                continue
+
+            # Niewysłane odczyty trafiają do bufora dyskowego klienta (jeśli jest skonfigurowany)
+            sent = self.client.send_batch(batch)
+            if sent < len(batch):
+                logging.warning(f"[CLIENT] Nie wysłano {len(batch) - sent} odczytów z kolejki")
+                if self.client.spool is None:
+                    self.dropped += len(batch) - sent
+
 
 def wait_for_enter(stop_event):
     input("Naciśnij ENTER, aby zakończyć działanie klienta...\n")
@@ -107,4 +487,5 @@ if __name__ == "__main__":
         print("\n[CLIENT] Zakończono działanie klienta przez użytkownika.")
 
     finally:
+        client.close()
         print("[CLIENT] Klient zatrzymany.")
\ No newline at end of file
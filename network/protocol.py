@@ -0,0 +1,245 @@
+import json
+import struct
+from datetime import datetime, timedelta, timezone
+
+# Protokół binarny SBP1 (sensor binary protocol) negocjowany na początku połączenia:
+# klient wysyła linię HELLO, a serwer, który go obsługuje, odpowiada HELLO_ACK.
+# Od tej chwili klient wysyła ramki binarne, a serwer nadal potwierdza je liniami ACK.
+# Serwer potwierdza zbiorczo wszystkie wiadomości z jednego odczytu gniazda ("ACK n").
+# Odpowiedzi dotyczą kolejnych wiadomości w kolejności wysłania: "ACK n" - n przyjętych,
+# "NAK n" - n odrzuconych (np. błędna wartość), więc klient wie, których nie ponawiać.
+HELLO = b'{"hello": "sbp1"}\n'
+HELLO_ACK = b"ACK SBP1\n"
+
+# Ramka: długość treści (uint16) + treść zaczynająca się od typu ramki.
+# Identyfikatory sensorów i jednostek są słownikowane osobno dla każdego połączenia:
+# ramka DEFINE_* nadaje nazwie numer, a ramki odczytów używają już tylko numerów.
+FRAME_HEADER = struct.Struct("!H")
+DEFINE = struct.Struct("!BH")          # typ, numer w słowniku + nazwa w UTF-8
+READING = struct.Struct("!BHHqd")      # typ, numer sensora, numer jednostki, epoch-ns, wartość
+
+DEFINE_SENSOR = 1
+DEFINE_UNIT = 2
+READING_NAIVE = 3   # znacznik czasu bez strefy (czas "ścienny" liczony od 1970-01-01)
+READING_UTC = 4     # znacznik czasu ze strefą, przesyłany w UTC
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Znacznik zwracany przez StreamDecoder.feed, gdy klient poprosił o protokół binarny
+HANDSHAKE = object()
+# Znacznik zwracany przez StreamDecoder.feed w miejscu wiadomości, której nie udało się zdekodować
+REJECTED = object()
+
+# Rozmiar pojedynczego odczytu z gniazda po stronie serwera
+RECV_SIZE = 65536
+
+
+def ack(count):
+    """
+    Zbiorcze potwierdzenie count wiadomości: "ACK n". Pojedyncza wiadomość
+    dostaje zwykłe "ACK", więc klienci wysyłający po jednym odczycie działają bez zmian.
+    """
+    return b"ACK\n" if count == 1 else b"ACK %d\n" % count
+
+
+def nak(count):
+    """Odrzucenie count kolejnych wiadomości: "NAK" lub "NAK n" (jak w ack)."""
+    return b"NAK\n" if count == 1 else b"NAK %d\n" % count
+
+
+def parse_reply(line):
+    """
+    Zwraca krotkę (przyjęte, odrzucone) dla linii "ACK", "ACK n", "NAK" lub "NAK n".
+    Linia dotyczy kolejnych, jeszcze niepotwierdzonych wiadomości.
+    """
+    parts = line.split()
+    if parts and parts[0] in (b"ACK", b"NAK"):
+        if len(parts) == 1:
+            count = 1
+        elif len(parts) == 2 and parts[1].isdigit():
+            count = int(parts[1])
+        else:
+            count = None
+        if count is not None:
+            return (count, 0) if parts[0] == b"ACK" else (0, count)
+    raise ConnectionError(f"Nieoczekiwany błąd ACK: {line}")
+
+
+def to_epoch_ns(timestamp):
+    """Zamienia datetime na liczbę nanosekund od epoki (bez strat dla mikrosekund)."""
+    if timestamp.tzinfo is None:
+        delta = timestamp - _EPOCH
+    else:
+        delta = timestamp - _EPOCH_UTC
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+
+def from_epoch_ns(ns, utc=False):
+    return (_EPOCH_UTC if utc else _EPOCH) + timedelta(microseconds=ns // 1000)
+
+
+def parse_json_reading(line):
+    """Zamienia linię JSON na argumenty dla Logger.log_reading."""
+    message = json.loads(line)
+    return {
+        "timestamp": datetime.fromisoformat(message["timestamp"]),
+        "sensor_id": message["sensor_id"],
+        "value": message["value"],
+        "unit": message["unit"]
+    }
+
+
+def is_hello(line):
+    if not line.startswith(b'{"hello"'):
+        return False
+    try:
+        return json.loads(line.decode("utf-8")).get("hello") == "sbp1"
+    except ValueError:
+        return False
+
+
+class BinaryEncoder:
+    """Koduje odczyty w ramki SBP1; jeden obiekt na jedno połączenie."""
+
+    def __init__(self):
+        self._sensors = {}
+        self._units = {}
+
+    def _ref(self, kind, table, name, out):
+        name = str(name)  # identyfikatory liczbowe trafiają do tabeli jako tekst, jak po dekodowaniu
+        ref = table.get(name)
+        if ref is None:
+            ref = table[name] = len(table)
+            payload = DEFINE.pack(kind, ref) + name.encode("utf-8")
+            out.append(FRAME_HEADER.pack(len(payload)) + payload)
+        return ref
+
+    def encode(self, sensor_id, value, unit, timestamp):
+        frames = []
+        sensor_ref = self._ref(DEFINE_SENSOR, self._sensors, sensor_id, frames)
+        unit_ref = self._ref(DEFINE_UNIT, self._units, unit, frames)
+        kind = READING_NAIVE if timestamp.tzinfo is None else READING_UTC
+        frames.append(FRAME_HEADER.pack(READING.size)
+                      + READING.pack(kind, sensor_ref, unit_ref, to_epoch_ns(timestamp), value))
+        return b"".join(frames)
+
+
+class StreamDecoder:
+    """
+    Dekoder strumienia od jednego klienta. Przyjmuje surowe dane z gniazda
+    i zwraca kompletne odczyty (słowniki dla Logger.log_reading), obsługując
+    zarówno linie JSON, jak i ramki SBP1 po wynegocjowaniu protokołu binarnego.
+    Niepełne wiadomości czekają w buforze na resztę danych.
+
+    Bufor to jeden bytearray: nowe dane są do niego dopisywane, wszystkie kompletne
+    wiadomości są przetwarzane w jednym przebiegu po indeksach (ramki binarne
+    przez memoryview, bez kopiowania), a przetworzona część jest usuwana raz
+    na wywołanie feed - koszt nie rośnie kwadratowo przy dużych paczkach.
+    """
+
+    def __init__(self, on_error=None):
+        self.binary = False
+        self.on_error = on_error or (lambda e: print(f"[SERVER] Błąd podczas obsługi danych: {e}"))
+        self._buffer = bytearray()
+        self._sensors = {}
+        self._units = {}
+
+    def feed(self, data):
+        """
+        :param data: bajty lub memoryview z gniazda
+        :return: lista odczytów; znacznik HANDSHAKE oznacza, że w tym miejscu
+                 należy odesłać klientowi HELLO_ACK, a REJECTED - wiadomość,
+                 której nie udało się zdekodować
+        """
+        buffer = self._buffer
+        buffer += data
+        items = []
+        pos = 0
+        while True:
+            if self.binary:
+                with memoryview(buffer) as view:
+                    pos = self._decode_frames(view, pos, items)
+                break
+            end = buffer.find(b"\n", pos)
+            if end < 0:
+                break
+            line = bytes(buffer[pos:end]).strip()
+            pos = end + 1
+            if not line:
+                continue
+            if is_hello(line):
+                self.binary = True
+                items.append(HANDSHAKE)
+                continue
+            try:
+                items.append(parse_json_reading(line))
+            except Exception as e:
+                self.on_error(e)
+                items.append(REJECTED)
+        del buffer[:pos]
+        return items
+
+    def process(self, data, handle):
+        """
+        Dekoduje dane i przekazuje każdy odczyt do funkcji handle. Zwraca jedną
+        odpowiedź dla klienta: HELLO_ACK po negocjacji oraz, w kolejności wiadomości,
+        zbiorcze ACK za odczyty obsłużone bez błędu i NAK za odczyty odrzucone.
+        """
+        replies = []
+        # Bieżąca seria kolejnych przyjętych (run_ok) albo odrzuconych wiadomości
+        run_ok, run = True, 0
+        for item in self.feed(data):
+            if item is HANDSHAKE:
+                if run:
+                    replies.append(ack(run) if run_ok else nak(run))
+                    run = 0
+                replies.append(HELLO_ACK)
+                continue
+            ok = item is not REJECTED
+            if ok:
+                try:
+                    handle(item)
+                except Exception as e:
+                    self.on_error(e)
+                    ok = False
+            if run and ok != run_ok:
+                replies.append(ack(run) if run_ok else nak(run))
+                run = 0
+            run_ok = ok
+            run += 1
+        if run:
+            replies.append(ack(run) if run_ok else nak(run))
+        return b"".join(replies)
+
+    def _decode_frames(self, view, pos, items):
+        size = len(view)
+        sensors = self._sensors
+        units = self._units
+        while pos + FRAME_HEADER.size <= size:
+            (length,) = FRAME_HEADER.unpack_from(view, pos)
+            start = pos + FRAME_HEADER.size
+            if start + length > size:
+                break
+            pos = start + length
+            try:
+                kind = view[start]
+                if kind == READING_NAIVE or kind == READING_UTC:
+                    _, sensor_ref, unit_ref, ns, value = READING.unpack_from(view, start)
+                    items.append({
+                        "timestamp": from_epoch_ns(ns, utc=kind == READING_UTC),
+                        "sensor_id": sensors[sensor_ref],
+                        "value": value,
+                        "unit": units[unit_ref]
+                    })
+                elif kind == DEFINE_SENSOR or kind == DEFINE_UNIT:
+                    _, ref = DEFINE.unpack_from(view, start)
+                    name = str(view[start + DEFINE.size:pos], "utf-8")
+                    (sensors if kind == DEFINE_SENSOR else units)[ref] = name
+                else:
+                    raise ValueError(f"Nieznany typ ramki: {kind}")
+            except Exception as e:
+                self.on_error(e)
+                if length and view[start] in (READING_NAIVE, READING_UTC):
+                    items.append(REJECTED)  # klient czeka na odpowiedź za każdy odczyt
+        return pos
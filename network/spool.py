@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+
+class Spool:
+    """
+    Dyskowy bufor typu store-and-forward dla niewysłanych odczytów.
+
+    Odczyty są dopisywane (append-only) jako linie JSON do plików segmentów
+    segment_XXXXXXXX.log, a pozycja ostatniego potwierdzonego odczytu
+    (segment, offset) jest zapisywana w commit.json. Segmenty w całości
+    potwierdzone są usuwane, a po przekroczeniu max_total_bytes najstarsze
+    segmenty są porzucane, żeby ograniczyć zajętość dysku.
+    """
+
+    COMMIT_FILE = "commit.json"
+
+    def __init__(self, directory, segment_max_bytes=1024 * 1024, max_total_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_total_bytes = max_total_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._segments = sorted(
+            int(name[8:-4]) for name in os.listdir(self.directory)
+            if name.startswith("segment_") and name.endswith(".log")
+        )
+        self._commit = self._load_commit()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"segment_{segment:08d}.log")
+
+    def _load_commit(self):
+        try:
+            with open(os.path.join(self.directory, self.COMMIT_FILE), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data["segment"], data["offset"]
+        except (OSError, ValueError, KeyError):
+            return (self._segments[0], 0) if self._segments else (0, 0)
+
+    def _save_commit(self):
+        path = os.path.join(self.directory, self.COMMIT_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"segment": self._commit[0], "offset": self._commit[1]}, f)
+        os.replace(path + ".tmp", path)
+
+    def append(self, readings):
+        """Dopisuje odczyty (sensor_id, value, unit, timestamp) na koniec bufora."""
+        data = "".join(
+            json.dumps({"sensor_id": sensor_id, "value": value, "unit": unit,
+                        "timestamp": timestamp.isoformat()}) + "\n"
+            for sensor_id, value, unit, timestamp in readings
+        ).encode("utf-8")
+        if not data:
+            return
+
+        with self._lock:
+            if not self._segments:
+                self._segments.append(self._commit[0])
+            path = self._segment_path(self._segments[-1])
+            if os.path.exists(path) and os.path.getsize(path) >= self.segment_max_bytes:
+                self._segments.append(self._segments[-1] + 1)
+                path = self._segment_path(self._segments[-1])
+            with open(path, "ab") as f:
+                f.write(data)
+            self._enforce_limit()
+
+    def _enforce_limit(self):
+        total = sum(os.path.getsize(self._segment_path(segment)) for segment in self._segments)
+        while total > self.max_total_bytes and len(self._segments) > 1:
+            segment = self._segments.pop(0)
+            path = self._segment_path(segment)
+            total -= os.path.getsize(path)
+            os.remove(path)
+            self._commit = (self._segments[0], 0)
+            self._save_commit()
+            logging.warning(f"[SPOOL] Przekroczono limit bufora - porzucono segment {segment}")
+
+    def read(self, max_records):
+        """
+        Zwraca do max_records najstarszych niepotwierdzonych odczytów jako listę
+        par (odczyt, pozycja); pozycję ostatniego wysłanego odczytu przekazuje się do commit().
+        """
+        with self._lock:
+            records = []
+            skipped = None
+            segment, offset = self._commit
+            for current in self._segments:
+                if current < segment:
+                    continue
+                start = offset if current == segment else 0
+                with open(self._segment_path(current), "rb") as f:
+                    f.seek(start)
+                    while len(records) < max_records:
+                        line = f.readline()
+                        if not line.endswith(b"\n"):
+                            break  # koniec segmentu (lub niedokończony zapis)
+                        position = (current, f.tell())
+                        try:
+                            data = json.loads(line)
+                            reading = (data["sensor_id"], data["value"], data["unit"],
+                                       datetime.fromisoformat(data["timestamp"]))
+                        except (ValueError, KeyError):
+                            skipped = position  # uszkodzony wpis jest pomijany
+                            continue
+                        records.append((reading, position))
+                if len(records) >= max_records:
+                    break
+            if not records and skipped is not None:
+                self._commit = skipped
+                self._save_commit()
+            return records
+
+    def commit(self, position):
+        """Oznacza odczyty do pozycji włącznie jako dostarczone i usuwa zbędne segmenty."""
+        with self._lock:
+            self._commit = position
+            while len(self._segments) > 1 and self._segments[0] < position[0]:
+                os.remove(self._segment_path(self._segments.pop(0)))
+            self._save_commit()
+
+    def is_empty(self):
+        with self._lock:
+            if not self._segments:
+                return True
+            last = self._segments[-1]
+            return self._commit >= (last, os.path.getsize(self._segment_path(last)))
@@ -0,0 +1,323 @@
+"""
+Zapytania analityczne na logach czujników: wczytuje pliki logów (bieżące,
+archiwa ZIP i .tsz, pliki CSV i kolumnowe, wszystkie shardy) paczkami do
+tablic NumPy i liczy agregaty per czujnik w przedziałach czasu (count, mean,
+min, max, percentyle) operacjami wektorowymi - bez słownika Pythona na wiersz.
+
+Pamięć: bez percentyli stan zapytania to tylko agregaty przedziałów; percentyle
+są dokładne, więc wymagają przechowania wartości z zakresu (16 B na odczyt).
+
+Przykład:
+    python query.py --start 2025-01-01 --end 2025-01-02 --resolution 15m --percentiles 50,95
+    python query.py --sensor T-001 --resolution 1h
+"""
+import argparse
+import mmap
+import os
+import re
+import sys
+import zipfile
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+import csvload
+import gorilla
+from logger import ARCHIVE_FORMATS, Logger, local_timestamp
+from storage import detect_storage
+
+DEFAULT_CHUNK_ROWS = 250_000
+# Szacunkowa długość wiersza CSV - paczki plików CSV są wyznaczane zakresami bajtów
+_CSV_ROW_BYTES = 48
+
+# Klucz grupy: numer przedziału * _MAX_SERIES + numer szeregu (sensor_id, unit)
+_MAX_SERIES = 1 << 20
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_RESOLUTION = re.compile(r'^(\d+)(ms|s|m|h|d)$')
+_RESOLUTION_UNITS = {
+    'ms': timedelta(milliseconds=1),
+    's': timedelta(seconds=1),
+    'm': timedelta(minutes=1),
+    'h': timedelta(hours=1),
+    'd': timedelta(days=1),
+}
+
+
+def _to_micros(timestamp: datetime) -> int:
+    # Logger przechowuje znaczniki w czasie lokalnym bez strefy
+    return (local_timestamp(timestamp) - _EPOCH) // _MICROSECOND
+
+
+def _csv_chunks(data, offset: int, chunk_rows: int) -> Iterator[Dict]:
+    for start, end in csvload.byte_ranges(len(data), chunk_rows * _CSV_ROW_BYTES, offset):
+        yield csvload.load_buffer(data, start, end)
+
+
+def _storage_chunks(raw, offset: int, chunk_rows: int) -> Iterator[Dict]:
+    storage = detect_storage(raw)
+    if storage.name == 'columnar':
+        yield from storage.iter_columns(raw, offset, chunk_rows)
+    else:
+        yield from _csv_chunks(raw.read(), offset, chunk_rows)
+
+
+def _tsz_chunks(raw, chunk_rows: int) -> Iterator[Dict]:
+    parts = []
+    rows = 0
+    for sensor_id, unit, times, values in gorilla.iter_series(raw):
+        parts.append((sensor_id, unit, times, values))
+        rows += len(values)
+        if rows >= chunk_rows:
+            yield _series_chunk(parts)
+            parts, rows = [], 0
+    if parts:
+        yield _series_chunk(parts)
+
+
+def _series_chunk(parts) -> Dict:
+    sensors = [sensor_id for sensor_id, _, _, _ in parts]
+    units = [unit for _, unit, _, _ in parts]
+    lengths = [len(values) for _, _, _, values in parts]
+    return {
+        "timestamp": np.concatenate([np.array(times, dtype=np.int64) for _, _, times, _ in parts])
+                       .astype('datetime64[us]'),
+        "value": np.concatenate([np.array(values, dtype=np.float64) for _, _, _, values in parts]),
+        "sensor": np.repeat(np.arange(len(parts)), lengths),
+        "unit": np.repeat(np.arange(len(parts)), lengths),
+        "sensors": sensors,
+        "units": units,
+    }
+
+
+def file_chunks(file_path: str, offset: int = 0, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Dict]:
+    """
+    Zwraca plik logu paczkami tablic: timestamp (datetime64[us]), value (float64)
+    oraz kody sensor/unit wskazujące na listy nazw sensors/units danej paczki.
+    Format pliku jest rozpoznawany jak w Logger._iter_rows.
+    """
+    try:
+        if file_path.endswith(gorilla.SUFFIX):
+            with open(file_path, 'rb') as raw:
+                yield from _tsz_chunks(raw, chunk_rows)
+        elif file_path.endswith('.zip'):
+            with zipfile.ZipFile(file_path) as zipf:
+                members = zipf.namelist()
+                for member in members:
+                    with zipf.open(member) as raw:
+                        yield from _storage_chunks(raw, offset if len(members) == 1 else 0, chunk_rows)
+        else:
+            with open(file_path, 'rb') as raw:
+                if detect_storage(raw).name == 'csv' and os.fstat(raw.fileno()).st_size:
+                    # Bieżący plik CSV: mmap i parsowanie zakresami bajtów, bez wczytywania całości
+                    with mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        yield from _csv_chunks(mm, offset, chunk_rows)
+                else:
+                    yield from _storage_chunks(raw, offset, chunk_rows)
+    except FileNotFoundError:
+        # Plik mógł zostać właśnie zarchiwizowany przez logger
+        for suffix in ARCHIVE_FORMATS.values():
+            if not file_path.endswith(suffix) and os.path.exists(file_path + suffix):
+                yield from file_chunks(file_path + suffix, offset, chunk_rows)
+                break
+
+
+def load_chunks(config_path: str, start: datetime, end: datetime, sensor_id: Optional[str] = None,
+                chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Dict]:
+    """
+    Wczytuje paczkami odczyty z zakresu [start, end] z logów wszystkich shardów
+    (pliki dobierane jak w Logger.read_logs: sidecary i rzadki indeks).
+    Filtr zakresu i czujnika jest nakładany wektorowo na każdą paczkę.
+    """
+    base = Logger(config_path)
+    loggers = [base] + [Logger(config_path, shard=shard) for shard in base.shards()]
+    first = np.datetime64(_to_micros(start), 'us')
+    last = np.datetime64(_to_micros(end), 'us')
+    for logger in loggers:
+        for file_path, offset in logger.log_files(start, end, sensor_id):
+            for chunk in file_chunks(file_path, offset, chunk_rows):
+                mask = (chunk['timestamp'] >= first) & (chunk['timestamp'] <= last)
+                if sensor_id is not None:
+                    codes = [code for code, name in enumerate(chunk['sensors']) if name == sensor_id]
+                    mask &= np.isin(chunk['sensor'], codes)
+                if not mask.any():
+                    continue
+                if not mask.all():
+                    chunk.update({column: chunk[column][mask] for column in ('timestamp', 'value', 'sensor', 'unit')})
+                yield chunk
+
+
+def _reduce(keys, count, total, minimum, maximum):
+    """Łączy wiersze o tym samym kluczu (sortowanie + reduceat)."""
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return (keys[starts],
+            np.add.reduceat(count[order], starts),
+            np.add.reduceat(total[order], starts),
+            np.minimum.reduceat(minimum[order], starts),
+            np.maximum.reduceat(maximum[order], starts))
+
+
+class BucketAggregator:
+    """
+    Agregaty per (przedział, sensor_id, unit) liczone przyrostowo z kolejnych paczek.
+    Przedziały są wyrównane do epoki (jak rollup.bucket_start); wynik to słownik
+    kolumn NumPy posortowany po (bucket, sensor_id) - gotowy np. dla pandas.DataFrame.
+    """
+
+    def __init__(self, resolution: timedelta, start: datetime, percentiles: Sequence[float] = ()):
+        self.width = resolution // _MICROSECOND
+        if self.width <= 0:
+            raise ValueError("Rozdzielczość musi być dodatnia")
+        start_us = _to_micros(start)
+        self.origin = start_us - start_us % self.width
+        self.percentiles = tuple(percentiles)
+        self._series = {}
+        self._state = None
+        self._keys = []
+        self._values = []
+
+    def add(self, chunk: Dict):
+        values = chunk['value']
+        if not len(values):
+            return
+        # Nazwy są słownikowane per paczka - mapowanie par (sensor, unit) na numery szeregów zapytania
+        unit_count = max(len(chunk['units']), 1)
+        pairs, inverse = np.unique(chunk['sensor'].astype(np.int64) * unit_count + chunk['unit'],
+                                   return_inverse=True)
+        series_map = np.array([self._series.setdefault((chunk['sensors'][pair // unit_count],
+                                                        chunk['units'][pair % unit_count]), len(self._series))
+                               for pair in pairs.tolist()], dtype=np.int64)
+        if len(self._series) > _MAX_SERIES:
+            raise ValueError("Zbyt wiele szeregów (sensor_id, unit) w zapytaniu")
+        buckets = (chunk['timestamp'].astype(np.int64) - self.origin) // self.width
+        keys = buckets * _MAX_SERIES + series_map[inverse]
+
+        partial = _reduce(keys, np.ones(len(values), dtype=np.int64), values, values, values)
+        if self._state is not None:
+            partial = _reduce(*(np.concatenate(pair) for pair in zip(self._state, partial)))
+        self._state = partial
+        if self.percentiles:
+            self._keys.append(keys)
+            self._values.append(values)
+
+    def result(self) -> Dict:
+        names = ["bucket", "sensor_id", "unit", "count", "mean", "min", "max"] + \
+                [percentile_name(q) for q in self.percentiles]
+        if self._state is None:
+            return {name: np.empty(0) for name in names}
+        keys, count, total, minimum, maximum = self._state
+        result = {"count": count, "mean": total / count, "min": minimum, "max": maximum}
+
+        if self.percentiles:
+            # Wartości posortowane w obrębie grup - grupy w tej samej kolejności co keys
+            all_keys = np.concatenate(self._keys)
+            all_values = np.concatenate(self._values)
+            sorted_values = all_values[np.lexsort((all_values, all_keys))]
+            first = np.cumsum(count) - count
+            for q in self.percentiles:
+                position = first + (count - 1) * (q / 100)
+                lower = np.floor(position).astype(np.int64)
+                upper = np.minimum(lower + 1, first + count - 1)
+                fraction = position - lower
+                result[percentile_name(q)] = (sorted_values[lower]
+                                              + (sorted_values[upper] - sorted_values[lower]) * fraction)
+
+        series_names = list(self._series)
+        sensors = np.array([sensor for sensor, _ in series_names], dtype=str)
+        units = np.array([unit for _, unit in series_names], dtype=str)
+        series = keys % _MAX_SERIES
+        buckets = keys // _MAX_SERIES
+        # Kolejność wyniku: przedział, potem nazwa czujnika (ranga szeregu wg nazw)
+        rank = np.empty(len(series_names), dtype=np.int64)
+        rank[np.lexsort((units, sensors))] = np.arange(len(series_names))
+        order = np.lexsort((rank[series], buckets))
+
+        result["bucket"] = (self.origin + buckets * self.width).astype('datetime64[us]')
+        result["sensor_id"] = sensors[series]
+        result["unit"] = units[series]
+        return {name: result[name][order] for name in names}
+
+
+def percentile_name(q: float) -> str:
+    return f"p{q:g}".replace('.', '_')
+
+
+def aggregate(config_path: str, start: datetime, end: datetime, resolution: timedelta,
+              sensor_id: Optional[str] = None, percentiles: Sequence[float] = (),
+              chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict:
+    """
+    Agregaty odczytów z zakresu [start, end] w przedziałach o szerokości resolution:
+    słownik kolumn bucket, sensor_id, unit, count, mean, min, max oraz p{q}
+    dla każdego żądanego percentyla (interpolacja liniowa, jak numpy.percentile).
+    """
+    aggregator = BucketAggregator(resolution, start, percentiles)
+    for chunk in load_chunks(config_path, start, end, sensor_id, chunk_rows):
+        aggregator.add(chunk)
+    return aggregator.result()
+
+
+def parse_resolution(text: str) -> timedelta:
+    match = _RESOLUTION.match(text.strip())
+    if match is None or int(match.group(1)) == 0:
+        raise argparse.ArgumentTypeError(f"Nieprawidłowa rozdzielczość: {text} (np. 500ms, 10s, 5m, 1h, 1d)")
+    return int(match.group(1)) * _RESOLUTION_UNITS[match.group(2)]
+
+
+def parse_percentiles(text: str):
+    try:
+        percentiles = [float(part) for part in text.split(',') if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Nieprawidłowa lista percentyli: {text}")
+    if any(not 0 <= q <= 100 for q in percentiles):
+        raise argparse.ArgumentTypeError("Percentyle muszą należeć do [0, 100]")
+    return percentiles
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Agregaty odczytów czujników w przedziałach czasu")
+    parser.add_argument("--config", default="config.json", help="konfiguracja Loggera")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=_EPOCH, help="początek zakresu (ISO 8601)")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None,
+                        help="koniec zakresu (ISO 8601, domyślnie teraz)")
+    parser.add_argument("--resolution", type=parse_resolution, default=timedelta(hours=1),
+                        help="szerokość przedziału, np. 10s, 5m, 1h, 1d")
+    parser.add_argument("--sensor", help="tylko wskazany czujnik")
+    parser.add_argument("--percentiles", type=parse_percentiles, default=[], help="np. 50,95,99")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="wiersze w jednej paczce")
+    args = parser.parse_args(argv)
+    if args.end is None:
+        args.end = datetime.now()
+    return args
+
+
+def format_table(result: Dict) -> str:
+    names = list(result)
+    rows = [names]
+    for i in range(len(result["count"])):
+        row = []
+        for name in names:
+            value = result[name][i]
+            if name == "bucket":
+                row.append(str(value.astype('datetime64[s]' if value.astype(np.int64) % 1_000_000 == 0 else 'us')))
+            elif name == "count" or isinstance(value, str):
+                row.append(str(value))
+            else:
+                row.append(f"{value:.3f}")
+        rows.append(row)
+    widths = [max(len(row[column]) for row in rows) for column in range(len(names))]
+    return "".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() + "\n"
+                   for row in rows)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = aggregate(args.config, args.start, args.end, args.resolution, args.sensor,
+                       args.percentiles, args.chunk_rows)
+    sys.stdout.write(format_table(result))
+
+
+if __name__ == "__main__":
+    main()
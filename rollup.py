@@ -0,0 +1,264 @@
+import csv
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+# Agregaty odczytów (count, sum, min, max, last) per czujnik w przedziałach
+# minutowych i godzinowych, zapisywane w log_dir/rollups/ obok surowych logów.
+# Tier: (nazwa, szerokość przedziału, wzorzec daty w nazwie pliku).
+TIERS = (
+    ('1m', timedelta(minutes=1), '%Y%m%d'),
+    ('1h', timedelta(hours=1), '%Y%m'),
+)
+
+HEADER = ["bucket", "sensor_id", "unit", "count", "sum", "min", "max", "last_timestamp", "last"]
+
+# Pokrycie tierów: od którego przedziału pliki tieru zawierają wszystkie odczyty.
+# Wcześniejsze dane (sprzed włączenia agregatów lub z usuniętych plików) są
+# liczone z surowych logów.
+COVERAGE_FILE = "coverage.json"
+_coverage_lock = threading.Lock()
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def bucket_start(timestamp: datetime, width: timedelta) -> datetime:
+    epoch = _EPOCH if timestamp.tzinfo is None else _EPOCH_UTC
+    return timestamp - (timestamp - epoch) % width
+
+
+def _merge(aggregate: List, other: List):
+    """Łączy dwa agregaty [count, sum, min, max, last_timestamp, last] (wynik w aggregate)."""
+    aggregate[0] += other[0]
+    aggregate[1] += other[1]
+    aggregate[2] = min(aggregate[2], other[2])
+    aggregate[3] = max(aggregate[3], other[3])
+    if other[4] >= aggregate[4]:
+        aggregate[4], aggregate[5] = other[4], other[5]
+
+
+def _as_dict(bucket, sensor_id, unit, aggregate) -> Dict:
+    count, total, minimum, maximum, _, last = aggregate
+    return {
+        "bucket": bucket,
+        "sensor_id": sensor_id,
+        "unit": unit,
+        "count": count,
+        "sum": total,
+        "mean": total / count,
+        "min": minimum,
+        "max": maximum,
+        "last": last,
+    }
+
+
+def read_coverage(directory: str) -> Dict[str, datetime]:
+    """Zwraca {tier: początek pokrycia}; tiery bez wpisu nie mają jeszcze żadnych danych."""
+    try:
+        with open(os.path.join(directory, COVERAGE_FILE), encoding='utf-8') as f:
+            return {name: datetime.fromisoformat(since) for name, since in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def _update_coverage(directory: str, update):
+    with _coverage_lock:
+        coverage = read_coverage(directory)
+        if not update(coverage):
+            return
+        path = os.path.join(directory, COVERAGE_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({name: since.isoformat() for name, since in coverage.items()}, f)
+        os.replace(path + '.tmp', path)
+
+
+def mark_pruned(directory: str, file_name: str):
+    """Przesuwa pokrycie tieru za okres usuniętego pliku (np. po retencji)."""
+    for name, _, date_pattern in TIERS:
+        prefix = f"rollup_{name}_"
+        if not file_name.startswith(prefix):
+            continue
+        date = file_name[len(prefix):].split('.', 1)[0]
+        try:
+            period_start = datetime.strptime(date, date_pattern)
+        except ValueError:
+            return
+        if date_pattern == '%Y%m':
+            period_end = (period_start + timedelta(days=32)).replace(day=1)
+        else:
+            period_end = period_start + timedelta(days=1)
+
+        def advance(coverage):
+            if name not in coverage or coverage[name] >= period_end:
+                return False
+            coverage[name] = period_end
+            return True
+
+        _update_coverage(directory, advance)
+        return
+
+
+class RollupWriter:
+    """
+    Utrzymuje otwarte przedziały wszystkich tierów w pamięci i przy flush
+    dopisuje do plików te, które już się zakończyły (względem najnowszego
+    odczytu). Spóźnione odczyty dla zapisanego przedziału trafiają do
+    kolejnego, częściowego wiersza - odczyt łączy wiersze tego samego przedziału.
+    """
+
+    def __init__(self, directory: str, suffix: str = ''):
+        self.directory = directory
+        self.suffix = suffix  # np. ".w0" dla shardu serwera wieloprocesowego
+        os.makedirs(directory, exist_ok=True)
+        self._open = {name: {} for name, _, _ in TIERS}
+        self._latest = None
+        self._covered = set(read_coverage(directory))
+
+    def _record_coverage(self, name: str, width: timedelta, timestamp: datetime):
+        # Przedział pierwszego odczytu może zawierać wcześniejsze odczyty sprzed włączenia
+        # agregatów, więc pokrycie zaczyna się od następnego przedziału (chyba że odczyt go otwiera)
+        bucket = bucket_start(timestamp, width)
+        since = bucket if bucket == timestamp else bucket + width
+
+        def record(coverage):
+            if name in coverage:
+                return False  # pokrycie zapisał już inny proces (shard)
+            coverage[name] = since
+            return True
+
+        _update_coverage(self.directory, record)
+        self._covered.add(name)
+
+    def add(self, timestamp: datetime, sensor_id: str, value: float, unit: str):
+        value = float(value)
+        for name, width, _ in TIERS:
+            if name not in self._covered:
+                self._record_coverage(name, width, timestamp)
+            key = (bucket_start(timestamp, width), str(sensor_id), unit)
+            aggregate = self._open[name].get(key)
+            if aggregate is None:
+                self._open[name][key] = [1, value, value, value, timestamp, value]
+            else:
+                _merge(aggregate, [1, value, value, value, timestamp, value])
+        if self._latest is None or timestamp > self._latest:
+            self._latest = timestamp
+
+    def flush(self, final: bool = False):
+        """Zapisuje zakończone przedziały (final=True - wszystkie, np. przy zatrzymaniu loggera)."""
+        for name, width, date_pattern in TIERS:
+            open_buckets = self._open[name]
+            closed = [key for key in open_buckets if final or key[0] + width <= self._latest]
+            if not closed:
+                continue
+            rows_by_file = {}
+            for key in sorted(closed, key=lambda k: (k[0], k[1])):
+                bucket, sensor_id, unit = key
+                count, total, minimum, maximum, last_timestamp, last = open_buckets.pop(key)
+                path = self._path(name, bucket, date_pattern)
+                rows_by_file.setdefault(path, []).append(
+                    [bucket.isoformat(), sensor_id, unit, count, total, minimum, maximum,
+                     last_timestamp.isoformat(), last])
+            for path, rows in rows_by_file.items():
+                is_new_file = not os.path.exists(path)
+                with open(path, 'a', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    if is_new_file:
+                        writer.writerow(HEADER)
+                    writer.writerows(rows)
+
+    def _path(self, tier: str, bucket: datetime, date_pattern: str) -> str:
+        return os.path.join(self.directory, f"rollup_{tier}_{bucket.strftime(date_pattern)}{self.suffix}.csv")
+
+    def pending(self, tier: str) -> Dict:
+        """Kopia otwartych (jeszcze niezapisanych) przedziałów danego tieru."""
+        return {key: list(aggregate) for key, aggregate in self._open[tier].items()}
+
+
+def select_tier(resolution: timedelta) -> Optional[tuple]:
+    """Najgrubszy tier, którego przedziały składają się dokładnie na przedziały o szerokości resolution."""
+    for tier in reversed(TIERS):
+        width = tier[1]
+        if width <= resolution and resolution % width == timedelta(0):
+            return tier
+    return None
+
+
+def read_tier(directory: str, tier: tuple, start: datetime, end: datetime, resolution: timedelta,
+              sensor_id: Optional[str] = None, pending: Optional[Dict] = None,
+              covered_from: Optional[datetime] = None, raw: Optional[Dict] = None) -> List[Dict]:
+    """
+    Zwraca agregaty w przedziałach o szerokości resolution z plików tieru
+    (oraz otwartych przedziałów pending), posortowane po (bucket, sensor_id).
+    Uwzględniane są przedziały tieru zawarte w [start, end]. Przedziały tieru
+    sprzed covered_from są pomijane - zastępują je przedziały raw policzone
+    z surowych odczytów (aggregate_buckets).
+    """
+    name, width, date_pattern = tier
+    prefix = f"rollup_{name}_"
+    first_day = bucket_start(max(start, covered_from or start), width).strftime(date_pattern)
+    last_day = end.strftime(date_pattern)
+    result = {}
+
+    def add(bucket, sensor, unit, aggregate, from_tier=True):
+        if bucket < start or bucket + width - timedelta(microseconds=1) > end:
+            return
+        if from_tier and covered_from is not None and bucket < covered_from:
+            return
+        if sensor_id is not None and sensor != sensor_id:
+            return
+        key = (bucket_start(bucket, resolution), sensor, unit)
+        if key in result:
+            _merge(result[key], aggregate)
+        else:
+            result[key] = list(aggregate)
+
+    file_names = os.listdir(directory) if os.path.isdir(directory) else []
+    for file_name in sorted(file_names):
+        if not file_name.startswith(prefix):
+            continue
+        file_date = file_name[len(prefix):len(prefix) + len(first_day)]
+        if not first_day <= file_date <= last_day:
+            continue
+        with open(os.path.join(directory, file_name), newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # nagłówek
+            for row in reader:
+                try:
+                    aggregate = [int(row[3]), float(row[4]), float(row[5]), float(row[6]),
+                                 datetime.fromisoformat(row[7]), float(row[8])]
+                    add(datetime.fromisoformat(row[0]), row[1], row[2], aggregate)
+                except (ValueError, IndexError):
+                    continue  # niepełny lub uszkodzony wiersz
+
+    for (bucket, sensor, unit), aggregate in (pending or {}).items():
+        add(bucket, sensor, unit, aggregate)
+    for (bucket, sensor, unit), aggregate in (raw or {}).items():
+        add(bucket, sensor, unit, aggregate, from_tier=False)
+
+    return [_as_dict(bucket, sensor, unit, aggregate)
+            for (bucket, sensor, unit), aggregate in sorted(result.items(), key=lambda item: item[0][:2])]
+
+
+def aggregate_buckets(readings, width: timedelta) -> Dict:
+    """Agregaty surowych odczytów w przedziałach width: {(bucket, sensor_id, unit): agregat}."""
+    result = {}
+    for reading in readings:
+        value = float(reading["value"])
+        timestamp = reading["timestamp"]
+        key = (bucket_start(timestamp, width), reading["sensor_id"], reading["unit"])
+        aggregate = [1, value, value, value, timestamp, value]
+        if key in result:
+            _merge(result[key], aggregate)
+        else:
+            result[key] = aggregate
+    return result
+
+
+def aggregate_readings(readings, resolution: timedelta) -> List[Dict]:
+    """Agregaty w przedziałach resolution liczone z surowych odczytów (gdy żaden tier nie pasuje)."""
+    result = aggregate_buckets(readings, resolution)
+    return [_as_dict(bucket, sensor, unit, aggregate)
+            for (bucket, sensor, unit), aggregate in sorted(result.items(), key=lambda item: item[0][:2])]
@@ -1,13 +1,20 @@
+import asyncio
+import multiprocessing
 import socket
-import json
 import os
 import threading
 import yaml
-from datetime import datetime
-from logger import Logger  # zakładam, że Logger masz w osobnym pliku logger.py
+from logger import Logger, LoggerPipeline  # zakładam, że Logger masz w osobnym pliku logger.py
+from network.protocol import RECV_SIZE, StreamDecoder
+
+
+def _run_worker(config_path_yaml, config_path_json, shard, stop_event):
+    """Proces roboczy serwera wieloprocesowego: własne gniazdo (SO_REUSEPORT) i własny shard logów."""
+    NetworkServer(config_path_yaml, config_path_json, shard=shard).serve(stop_event)
+
 
 class NetworkServer:
-    def __init__(self, config_path_yaml="../config.yaml", config_path_json="../config.json"):
+    def __init__(self, config_path_yaml="../config.yaml", config_path_json="../config.json", shard=None):
         # Wczytanie konfiguracji YAML dla servera
         with open(config_path_yaml, "r", encoding="utf-8") as f:
             config = yaml.safe_load(f)
@@ -16,70 +23,164 @@ class NetworkServer:
         self.host = server_config.get("host", "0.0.0.0")
         self.port = server_config.get("port", 9000)
         self.log_path = server_config.get("log_path", "../logs")
+        # "blocking" - jeden klient naraz, "async" - wielu klientów na jednej pętli asyncio
+        self.mode = server_config.get("mode", "blocking")
+        self.backlog = server_config.get("backlog", 128)
+        # Liczba procesów roboczych współdzielących port (SO_REUSEPORT); 1 - jeden proces
+        self.workers = server_config.get("workers", 1)
+        self.shard = shard
+        self.config_path_yaml = config_path_yaml
+        self.config_path_json = config_path_json
+        if self.workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("Tryb wieloprocesowy wymaga SO_REUSEPORT (niedostępne w tym systemie)")
 
         os.makedirs(self.log_path, exist_ok=True)
 
-        # Inicjalizacja Loggera z konfiguracją JSON
-        self.logger = Logger(config_path_json)
-        self.logger.start()  # otwarcie pliku CSV do zapisu
+        # Inicjalizacja Loggera z konfiguracją JSON; w trybie wieloprocesowym
+        # proces nadrzędny niczego nie zapisuje - każdy proces roboczy ma własny shard
+        self.logger = None
+        if self.workers <= 1 or shard is not None:
+            self.logger = Logger(config_path_json, shard=shard)
+            self.logger.start()  # otwarcie pliku CSV do zapisu
+        self.log_pipeline = None
+        # Otwarte połączenia trybu async - zamykane przy zatrzymaniu serwera
+        self._writers = set()
 
     def start(self):
+        stop_event = threading.Event()
+
+        def wait_for_enter():
+            input("Naciśnij ENTER, aby zatrzymać serwer...\n")
+            stop_event.set()
+
+        threading.Thread(target=wait_for_enter, daemon=True).start()
+        self.serve(stop_event)
+
+    def serve(self, stop_event):
+        """Obsługuje klientów w wybranym trybie, aż do ustawienia stop_event."""
+        try:
+            if self.logger is None:
+                self._serve_workers(stop_event)
+            elif self.mode == "async":
+                asyncio.run(self._serve_async(stop_event))
+            else:
+                self._serve_blocking(stop_event)
+        except KeyboardInterrupt:
+            print("[SERVER] Zatrzymywanie serwera...")
+        finally:
+            if self.logger is not None:
+                self.logger.stop()  # zamknięcie pliku CSV przy końcu działania serwera
+            print("[SERVER] Serwer zatrzymany.")
+
+    def _serve_workers(self, stop_event):
+        """
+        Uruchamia workers procesów, z których każdy nasłuchuje na tym samym porcie
+        (SO_REUSEPORT - jądro rozdziela między nie połączenia) i zapisuje własny
+        shard logów. Parsowanie i zapis nie są więc ograniczone przez GIL jednego procesu.
+        Wspólny, uporządkowany odczyt shardów zapewnia logger.read_merged_logs.
+        """
+        worker_stop = multiprocessing.Event()
+        processes = [
+            multiprocessing.Process(target=_run_worker, name=f"server-worker-{n}",
+                                    args=(self.config_path_yaml, self.config_path_json, n, worker_stop))
+            for n in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+        print(f"[SERVER] Uruchomiono {self.workers} procesów roboczych na porcie {self.port}")
+
+        try:
+            while not stop_event.is_set() and any(process.is_alive() for process in processes):
+                stop_event.wait(0.5)
+        finally:
+            worker_stop.set()
+            for process in processes:
+                process.join(10)
+                if process.is_alive():
+                    process.terminate()
+
+    def _serve_blocking(self, stop_event):
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            if self.shard is not None:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             s.bind((self.host, self.port))
             s.listen(5)
 
             print(f"[SERVER] Serwer nasłuchuje na porcie {self.port}...")
 
-            stop_event = threading.Event()
-
-            def wait_for_enter():
-                input("Naciśnij ENTER, aby zatrzymać serwer...\n")
-                stop_event.set()
+            while not stop_event.is_set():
+                s.settimeout(1.0)  # timeout, żeby móc sprawdzać stop_event
+                try:
+                    conn, addr = s.accept()
+                except socket.timeout:
+                    continue  # sprawdzamy stop_event ponownie
+                print(f"[SERVER] Połączenie od: {addr}")
+                with conn:
+                    self._handle_client(conn)
 
-            threading.Thread(target=wait_for_enter, daemon=True).start()
+    async def _serve_async(self, stop_event):
+        # Logger nie jest bezpieczny wątkowo, więc odczyty trafiają przez kolejkę
+        # do jednego wątku zapisującego - pętla zdarzeń nie czeka na operacje na plikach
+        self.log_pipeline = LoggerPipeline(self.logger)
+        self.log_pipeline.start()
+        server = await asyncio.start_server(
+            self._handle_client_async, self.host, self.port, backlog=self.backlog,
+            reuse_port=self.shard is not None
+        )
+        print(f"[SERVER] Serwer (asyncio) nasłuchuje na porcie {self.port}...")
 
-            try:
+        try:
+            async with server:
                 while not stop_event.is_set():
-                    s.settimeout(1.0)  # timeout, żeby móc sprawdzać stop_event
-                    try:
-                        conn, addr = s.accept()
-                    except socket.timeout:
-                        continue  # sprawdzamy stop_event ponownie
-                    print(f"[SERVER] Połączenie od: {addr}")
-                    with conn:
-                        self._handle_client(conn)
-            except KeyboardInterrupt:
-                print("[SERVER] Zatrzymywanie serwera...")
-            finally:
-                self.logger.stop()  # zamknięcie pliku CSV przy końcu działania serwera
-                print("[SERVER] Serwer zatrzymany.")
+                    await asyncio.sleep(0.5)  # sprawdzamy stop_event
+                # Od Pythona 3.12.1 wyjście z "async with" czeka na zamknięcie wszystkich
+                # połączeń, więc stali klienci muszą zostać rozłączeni przez serwer
+                server.close()
+                if hasattr(server, "close_clients"):
+                    server.close_clients()
+                for writer in list(self._writers):
+                    writer.close()
+        finally:
+            self.log_pipeline.stop()
+
+    async def _handle_client_async(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        print(f"[SERVER] Połączenie od: {addr}")
+        # Dekoder obsługuje linie JSON oraz ramki binarne (po negocjacji protokołu)
+        decoder = StreamDecoder()
+        self._writers.add(writer)
+        try:
+            while True:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    break  # koniec połączenia (ewentualnie z niepełną wiadomością)
+                reply = decoder.process(data, lambda reading: self.log_pipeline.log_reading(**reading))
+                if reply:
+                    writer.write(reply)  # jedno zbiorcze ACK za wszystkie odebrane wiadomości
+                    await writer.drain()
+        except ConnectionError as e:
+            print(f"[SERVER] Błąd połączenia {addr}: {e}")
+        except asyncio.CancelledError:
+            pass  # pętla zdarzeń kończy działanie przy zatrzymaniu serwera
+        finally:
+            self._writers.discard(writer)
+            writer.close()
 
     def _handle_client(self, conn):
-        buffer = b""
-        while True:
-            data = conn.recv(1024)
-            if not data:
-                break
-            buffer += data
-            while b"\n" in buffer:
-                line, buffer = buffer.split(b"\n", 1)
-                try:
-                    message = json.loads(line.decode("utf-8"))
-                    print(f"[SERVER] Received: {message}")
-
-                    # Logowanie do CSV za pomocą Loggera
-                    self.logger.log_reading(
-                        timestamp=datetime.fromisoformat(message["timestamp"]),
-                        sensor_id=message["sensor_id"],
-                        value=message["value"],
-                        unit=message["unit"]
-                    )
-
-                    conn.sendall(b"ACK\n")
-
-                except Exception as e:
-                    print(f"[SERVER] Błąd podczas obsługi danych: {e}")
-                    # Możesz tutaj dodać logowanie błędów, jeśli chcesz
+        decoder = StreamDecoder()
+        # Dane trafiają wprost do stałego bufora (recv_into), a dekoder dostaje jego
+        # fragment jako memoryview - bez tworzenia nowych obiektów bytes dla każdego recv
+        recv_buffer = bytearray(RECV_SIZE)
+        with memoryview(recv_buffer) as view:
+            while True:
+                size = conn.recv_into(view)
+                if not size:
+                    break
+                # Logowanie do CSV za pomocą Loggera, jedno zbiorcze ACK za całą paczkę
+                reply = decoder.process(view[:size], lambda message: self.logger.log_reading(**message))
+                if reply:
+                    print(f"[SERVER] Potwierdzenie: {reply.decode().strip()}")
+                    conn.sendall(reply)
 
 if __name__ == "__main__":
     server = NetworkServer()
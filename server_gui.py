@@ -6,7 +6,9 @@ import json
 import yaml
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
-from logger import Logger
+import numpy as np
+from logger import Logger, LoggerPipeline
+from network.protocol import RECV_SIZE, StreamDecoder
 import socket
 import sys
 import os
@@ -23,52 +25,221 @@ except ImportError as e:
     sys.exit(1)
 
 
+def _to_ns(timestamp):
+    """Zamienia datetime na liczbę nanosekund od epoki"""
+    return int(timestamp.timestamp() * 1_000_000_000)
+
+
+class RingBuffer:
+    """Bufor cykliczny na tablicach typowanych: wartości float64, znaczniki czasu int64 (ns od epoki)"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.count = 0  # łączna liczba dodanych próbek (indeks bezwzględny następnej)
+
+    @property
+    def start(self):
+        """Indeks bezwzględny najstarszej przechowywanej próbki"""
+        return max(0, self.count - self.capacity)
+
+    def append(self, timestamp_ns, value):
+        """Dodaje próbkę i zwraca jej indeks bezwzględny"""
+        index = self.count
+        self.values[index % self.capacity] = value
+        self.timestamps[index % self.capacity] = timestamp_ns
+        self.count += 1
+        return index
+
+    def value(self, index):
+        return self.values[index % self.capacity]
+
+    def timestamp(self, index):
+        return self.timestamps[index % self.capacity]
+
+    def slice(self, first, end):
+        """Zwraca (timestamps, values) dla indeksów [first, end) jako tablice NumPy"""
+        first = max(first, self.start)
+        n = end - first
+        if n <= 0:
+            return self.timestamps[:0], self.values[:0]
+        i = first % self.capacity
+        if i + n <= self.capacity:
+            return self.timestamps[i:i + n], self.values[i:i + n]
+        k = i + n - self.capacity
+        return (np.concatenate((self.timestamps[i:], self.timestamps[:k])),
+                np.concatenate((self.values[i:], self.values[:k])))
+
+
+class RollingWindow:
+    """Okno czasowe nad RingBufferem: przyrostowa suma oraz min/max - zapytania w O(1)"""
+
+    def __init__(self, history, duration):
+        self.history = history
+        self.duration_ns = int(duration.total_seconds() * 1_000_000_000)
+        self.first = history.count  # indeks bezwzględny najstarszej próbki w oknie
+        self.total = 0.0
+        # Kolejki monotoniczne indeksów dla minimum i maksimum
+        self._min = deque()
+        self._max = deque()
+
+    def __len__(self):
+        return self.history.count - self.first
+
+    def added(self, index, value):
+        """Uwzględnia próbkę dopisaną do bufora pod indeksem index"""
+        self.total += value
+        values = self.history
+        while self._min and values.value(self._min[-1]) >= value:
+            self._min.pop()
+        self._min.append(index)
+        while self._max and values.value(self._max[-1]) <= value:
+            self._max.pop()
+        self._max.append(index)
+
+    def reserve(self):
+        """Usuwa z okna próbkę, którą nadpisze następny zapis do pełnego bufora"""
+        while self.first <= self.history.count - self.history.capacity:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        self.total -= self.history.value(self.first)
+        if self._min[0] == self.first:
+            self._min.popleft()
+        if self._max[0] == self.first:
+            self._max.popleft()
+        self.first += 1
+        if self.first == self.history.count:
+            self.total = 0.0  # brak kumulacji błędów zaokrągleń
+
+    def expire(self, now):
+        """Usuwa próbki starsze niż długość okna"""
+        cutoff = _to_ns(now) - self.duration_ns
+        while self.first < self.history.count and self.history.timestamp(self.first) < cutoff:
+            self._evict_oldest()
+
+    def average(self, now):
+        self.expire(now)
+        if not len(self):
+            return None
+        return self.total / len(self)
+
+    def minimum(self, now):
+        self.expire(now)
+        return float(self.history.value(self._min[0])) if self._min else None
+
+    def maximum(self, now):
+        self.expire(now)
+        return float(self.history.value(self._max[0])) if self._max else None
+
+    def arrays(self, now):
+        """Zwraca (timestamps, values) próbek w oknie - do obliczeń wektorowych"""
+        self.expire(now)
+        return self.history.slice(self.first, self.history.count)
+
+
 class SensorDataManager:
     """Zarządza danymi sensorów i oblicza średnie"""
 
+    WINDOWS_HOURS = (1, 12)
+
     def __init__(self):
-        self.sensor_data = defaultdict(lambda: {
-            'values': deque(maxlen=43200),  # 12h * 3600s = 43200 próbek (1 na sekundę)
-            'timestamps': deque(maxlen=43200),
+        self._lock = threading.Lock()
+        self.sensor_data = defaultdict(self._new_sensor)
+        # Sensory z nowymi odczytami od ostatniego odświeżenia (dict zachowuje kolejność)
+        self._dirty = {}
+
+    def _new_sensor(self):
+        history = RingBuffer(43200)  # 12h * 3600s = 43200 próbek (1 na sekundę)
+        return {
+            'history': history,
+            'windows': {hours: RollingWindow(history, timedelta(hours=hours)) for hours in self.WINDOWS_HOURS},
             'last_value': None,
             'last_timestamp': None,
             'unit': ''
-        })
+        }
 
     def add_reading(self, sensor_id, value, unit, timestamp):
         """Dodaje nowy odczyt sensora"""
-        data = self.sensor_data[sensor_id]
-        data['values'].append(float(value))
-        data['timestamps'].append(timestamp)
-        data['last_value'] = float(value)
-        data['last_timestamp'] = timestamp
-        data['unit'] = unit
+        value = float(value)
+        with self._lock:
+            data = self.sensor_data[sensor_id]
+            for window in data['windows'].values():
+                window.reserve()
+            index = data['history'].append(_to_ns(timestamp), value)
+            for window in data['windows'].values():
+                window.added(index, value)
+            data['last_value'] = value
+            data['last_timestamp'] = timestamp
+            data['unit'] = unit
+            self._dirty[sensor_id] = None
+
+    def _window(self, sensor_id, hours):
+        """Okno kroczące dla N godzin albo None, jeśli takiego okna nie ma"""
+        return self.sensor_data[sensor_id]['windows'].get(hours)
+
+    def _recent(self, sensor_id, hours):
+        """Próbki z ostatnich N godzin wybrane z całej historii - dla okresów bez okna kroczącego"""
+        history = self.sensor_data[sensor_id]['history']
+        timestamps, values = history.slice(history.start, history.count)
+        mask = timestamps >= _to_ns(datetime.now() - timedelta(hours=hours))
+        return timestamps[mask], values[mask]
 
     def get_average(self, sensor_id, hours):
         """Oblicza średnią z ostatnich N godzin"""
-        if sensor_id not in self.sensor_data:
-            return None
-
-        data = self.sensor_data[sensor_id]
-        if not data['values']:
-            return None
-
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-
-        # Filtruj wartości z ostatnich N godzin
-        recent_values = []
-        for timestamp, value in zip(data['timestamps'], data['values']):
-            if timestamp >= cutoff_time:
-                recent_values.append(value)
-
-        if not recent_values:
-            return None
-
-        return sum(recent_values) / len(recent_values)
+        with self._lock:
+            if sensor_id not in self.sensor_data:
+                return None
+            window = self._window(sensor_id, hours)
+            if window is not None:
+                return window.average(datetime.now())
+            _, values = self._recent(sensor_id, hours)
+            return float(values.mean()) if len(values) else None
+
+    def get_min(self, sensor_id, hours):
+        """Zwraca minimum z ostatnich N godzin"""
+        with self._lock:
+            if sensor_id not in self.sensor_data:
+                return None
+            window = self._window(sensor_id, hours)
+            if window is not None:
+                return window.minimum(datetime.now())
+            _, values = self._recent(sensor_id, hours)
+            return float(values.min()) if len(values) else None
+
+    def get_max(self, sensor_id, hours):
+        """Zwraca maksimum z ostatnich N godzin"""
+        with self._lock:
+            if sensor_id not in self.sensor_data:
+                return None
+            window = self._window(sensor_id, hours)
+            if window is not None:
+                return window.maximum(datetime.now())
+            _, values = self._recent(sensor_id, hours)
+            return float(values.max()) if len(values) else None
+
+    def get_window(self, sensor_id, hours):
+        """Zwraca tablice (timestamps w ns, values) z ostatnich N godzin"""
+        with self._lock:
+            if sensor_id not in self.sensor_data:
+                return None
+            window = self._window(sensor_id, hours)
+            if window is None:
+                return self._recent(sensor_id, hours)  # indeksowanie maską zwraca już kopie
+            timestamps, values = window.arrays(datetime.now())
+            return timestamps.copy(), values.copy()
+
+    def pop_dirty(self):
+        """Zwraca i czyści listę sensorów zmienionych od ostatniego wywołania"""
+        with self._lock:
+            dirty, self._dirty = list(self._dirty), {}
+            return dirty
 
     def get_sensor_list(self):
         """Zwraca listę wszystkich sensorów z danymi"""
-        return list(self.sensor_data.keys())
+        with self._lock:
+            return list(self.sensor_data.keys())
 
 
 class StatusBar(tk.Frame):
@@ -86,7 +257,100 @@ class StatusBar(tk.Frame):
         self.label.update_idletasks()
 
 
-class ServerGUI:
+class SensorIngest:
+    """
+    Ścieżka odbioru danych serwera GUI bez okna: dane klientów trafiają do
+    SensorDataManager i do wspólnego potoku Loggera.
+    """
+
+    def __init__(self):
+        self.data_manager = SensorDataManager()
+        self.is_running = False
+        # Jeden Logger wspólny dla wszystkich klientów, zasilany przez kolejkę
+        self.logger = None
+        self.log_pipeline = None
+        # Połączenia klientów: gniazdo -> wątek obsługi
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+    def start_logging(self, config_path="config.json"):
+        """Uruchamia wspólny potok logowania dla wszystkich połączeń"""
+        self.logger = Logger(config_path=config_path)
+        self.logger.start()
+        self.log_pipeline = LoggerPipeline(self.logger)
+        self.log_pipeline.start()
+
+    def serve_client(self, client_socket, address):
+        """Obsługuje klienta w osobnym wątku; po zatrzymaniu odbioru zamyka połączenie."""
+        with self._clients_lock:
+            if not self.is_running:
+                client_socket.close()
+                return
+            thread = threading.Thread(target=self.handle_client, args=(client_socket, address), daemon=True)
+            self._clients[client_socket] = thread
+            thread.start()
+
+    def stop_clients(self):
+        """Rozłącza klientów i czeka na zakończenie ich wątków obsługi."""
+        with self._clients_lock:
+            self.is_running = False
+            clients = list(self._clients.items())
+        for client_socket, _ in clients:
+            try:
+                # shutdown budzi wątek czekający w recv
+                client_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # połączenie zostało już zamknięte
+        for _, thread in clients:
+            thread.join()
+
+    def stop_logging(self):
+        """Zapisuje oczekujące odczyty i zamyka plik logu"""
+        if self.log_pipeline:
+            self.log_pipeline.stop()
+            self.log_pipeline = None
+        if self.logger:
+            self.logger.stop()
+            self.logger = None
+
+    def handle_client(self, client_socket, address):
+        log_pipeline = self.log_pipeline
+        # Klient może wysyłać wiele wiadomości naraz (pipelining), jako linie JSON
+        # lub ramki binarne SBP1 - niepełna wiadomość czeka w dekoderze na resztę danych
+        decoder = StreamDecoder(on_error=lambda e: print(f"Błąd przetwarzania danych: {e}"))
+
+        def handle(sensor_data):
+            # Aktualizuj GUI
+            self.data_manager.add_reading(
+                sensor_data['sensor_id'],
+                sensor_data['value'],
+                sensor_data['unit'],
+                sensor_data['timestamp']
+            )
+
+            # Zapisz do pliku CSV (przez wspólny potok loggera)
+            log_pipeline.log_reading(**sensor_data)
+
+        try:
+            while self.is_running:
+                data = client_socket.recv(RECV_SIZE)
+                if not data:
+                    break
+
+                # Jedno zbiorcze ACK za wszystkie wiadomości z tego odczytu gniazda
+                reply = decoder.process(data, handle)
+                if reply:
+                    client_socket.sendall(reply)
+
+        except Exception as e:
+            print(f"Błąd obsługi klienta {address}: {e}")
+        finally:
+            with self._clients_lock:
+                self._clients.pop(client_socket, None)
+            client_socket.close()
+
+
+class ServerGUI(SensorIngest):
     """Główna klasa GUI serwera"""
 
     def __init__(self, root):
@@ -95,11 +359,14 @@ class ServerGUI:
         self.root.geometry("800x600")
 
         # Inicjalizacja danych
-        self.data_manager = SensorDataManager()
+        super().__init__()
         self.server = None
         self.server_thread = None
-        self.is_running = False
         self.config_file = "gui_config.json"
+        # Wiersze tabeli: sensor_id -> element Treeview oraz ostatnio wyświetlone wartości
+        self._rows = {}
+        self._row_values = {}
+        self._ticks_since_full_refresh = 0
 
         # Wczytaj konfigurację
         self.load_config()
@@ -170,7 +437,8 @@ class ServerGUI:
         """Wczytuje konfigurację z pliku"""
         default_config = {
             'port': 9000,
-            'update_interval': 1
+            'update_interval': 1,
+            'full_refresh_every': 30
         }
 
         try:
@@ -205,7 +473,11 @@ class ServerGUI:
             test_socket.bind(('localhost', port))
             test_socket.close()
 
-            # Uruchom serwer w osobnym wątku
+            # Wspólny potok logowania dla wszystkich połączeń
+            self.start_logging("config.json")
+
+            # Uruchom serwer w osobnym wątku (is_running przed startem - pętla accept go sprawdza)
+            self.is_running = True
             self.server_thread = threading.Thread(target=self.run_server, args=(port,))
             self.server_thread.daemon = True
             self.server_thread.start()
@@ -217,7 +489,6 @@ class ServerGUI:
             self.status_label.config(text="Nasłuchiwanie", fg="green")
             self.status_bar.set_text(f"Nasłuchiwanie na porcie {port}")
 
-            self.is_running = True
             self.save_config()
 
         except ValueError as e:
@@ -245,12 +516,7 @@ class ServerGUI:
                     self.status_bar.set_text(f"Połączono z {address}")
 
                     # Obsłuż klienta w osobnym wątku
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, address)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
+                    self.serve_client(client_socket, address)
 
                 except socket.timeout:
                     continue
@@ -264,54 +530,13 @@ class ServerGUI:
             self.status_bar.set_text(f"Błąd serwera: {e}")
             print(f"Błąd serwera: {e}")
 
-    def handle_client(self, client_socket, address):
-        logger = None  # Inicjalizacja zmiennej
-        try:
-            # Inicjalizuj Logger z poprawną ścieżką
-            logger = Logger(config_path="config.json")  # <-- TU BYŁ BŁĄD
-            logger.start()
-
-            while self.is_running:
-                data = client_socket.recv(1024).decode('utf-8')
-                if not data:
-                    break
-
-                for line in data.strip().split('\n'):
-                    if line:
-                        try:
-                            sensor_data = json.loads(line)
-                            timestamp = datetime.fromisoformat(sensor_data['timestamp'])
-
-                            # Aktualizuj GUI
-                            self.data_manager.add_reading(
-                                sensor_data['sensor_id'],
-                                sensor_data['value'],
-                                sensor_data['unit'],
-                                timestamp
-                            )
-
-                            # Zapisz do pliku CSV
-                            logger.log_reading(
-                                timestamp=timestamp,
-                                sensor_id=sensor_data['sensor_id'],
-                                value=sensor_data['value'],
-                                unit=sensor_data['unit']
-                            )
-
-                            client_socket.send(b'ACK\n')
-                        except Exception as e:
-                            print(f"Błąd przetwarzania danych: {e}")
-
-        except Exception as e:
-            print(f"Błąd obsługi klienta {address}: {e}")
-        finally:
-            if logger:  # <-- WAŻNE: sprawdź czy logger istnieje
-                logger.stop()
-            client_socket.close()
-
     def stop_server(self):
         """Zatrzymuje serwer"""
-        self.is_running = False
+        # Najpierw rozłącz klientów - odczyt po zatrzymaniu potoku nie zostałby zapisany
+        self.stop_clients()
+
+        # Zapisz oczekujące odczyty i zamknij plik logu
+        self.stop_logging()
 
         # Aktualizuj interfejs
         self.start_btn.config(state=tk.NORMAL)
@@ -320,41 +545,47 @@ class ServerGUI:
         self.status_label.config(text="Zatrzymany", fg="red")
         self.status_bar.set_text("Serwer zatrzymany")
 
-    def update_table(self):
-        """Aktualizuje tabelę z danymi sensorów"""
-        # Wyczyść tabelę
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+    def _format_row(self, sensor_id):
+        """Przygotowuje wartości wiersza tabeli dla sensora"""
+        data = self.data_manager.sensor_data[sensor_id]
 
-        # Dodaj dane sensorów
-        for sensor_id in self.data_manager.get_sensor_list():
-            data = self.data_manager.sensor_data[sensor_id]
+        # Ostatnia wartość
+        last_value = f"{data['last_value']:.2f}" if data['last_value'] is not None else "-"
 
-            # Ostatnia wartość
-            last_value = f"{data['last_value']:.2f}" if data['last_value'] is not None else "-"
+        # Timestamp
+        if data['last_timestamp']:
+            timestamp_str = data['last_timestamp'].strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            timestamp_str = "-"
 
-            # Timestamp
-            if data['last_timestamp']:
-                timestamp_str = data['last_timestamp'].strftime("%Y-%m-%d %H:%M:%S")
-            else:
-                timestamp_str = "-"
-
-            # Średnie
-            avg_1h = self.data_manager.get_average(sensor_id, 1)
-            avg_12h = self.data_manager.get_average(sensor_id, 12)
-
-            avg_1h_str = f"{avg_1h:.2f}" if avg_1h is not None else "-"
-            avg_12h_str = f"{avg_12h:.2f}" if avg_12h is not None else "-"
-
-            # Dodaj wiersz do tabeli
-            self.tree.insert("", "end", values=(
-                sensor_id,
-                last_value,
-                data['unit'],
-                timestamp_str,
-                avg_1h_str,
-                avg_12h_str
-            ))
+        # Średnie
+        avg_1h = self.data_manager.get_average(sensor_id, 1)
+        avg_12h = self.data_manager.get_average(sensor_id, 12)
+
+        avg_1h_str = f"{avg_1h:.2f}" if avg_1h is not None else "-"
+        avg_12h_str = f"{avg_12h:.2f}" if avg_12h is not None else "-"
+
+        return (sensor_id, last_value, data['unit'], timestamp_str, avg_1h_str, avg_12h_str)
+
+    def update_table(self):
+        """Aktualizuje w tabeli tylko wiersze sensorów, których dane się zmieniły"""
+        sensor_ids = self.data_manager.pop_dirty()
+
+        # Średnie zmieniają się także bez nowych odczytów (próbki wypadają z okien),
+        # więc co kilka odświeżeń sprawdzane są wszystkie wiersze
+        self._ticks_since_full_refresh += 1
+        if self._ticks_since_full_refresh >= self.config.get('full_refresh_every', 30):
+            self._ticks_since_full_refresh = 0
+            sensor_ids = list(dict.fromkeys(list(self._rows) + sensor_ids))
+
+        for sensor_id in sensor_ids:
+            values = self._format_row(sensor_id)
+            item = self._rows.get(sensor_id)
+            if item is None:
+                self._rows[sensor_id] = self.tree.insert("", "end", values=values)
+            elif self._row_values.get(sensor_id) != values:
+                self.tree.item(item, values=values)
+            self._row_values[sensor_id] = values
 
     def update_timer(self):
         """Timer odświeżający interfejs co kilka sekund"""
@@ -0,0 +1,198 @@
+import csv
+import io
+import struct
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+# Formaty zapisu plików logów (config.json: "storage"). Logger przekazuje formatowi
+# paczki wierszy (timestamp, sensor_id, value, unit), a przy odczycie dostaje
+# z powrotem takie same krotki - rotacja, archiwizacja, sidecary i indeks
+# działają identycznie dla każdego formatu.
+
+_EPOCH = np.datetime64('1970-01-01T00:00:00', 'us')
+_EPOCH_DATETIME = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class CsvStorage:
+    """Domyślny format: tekstowy CSV z nagłówkiem."""
+
+    name = 'csv'
+    HEADER = ["timestamp", "sensor_id", "value", "unit"]
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, delimiter=',')
+
+    def _encode(self, rows) -> bytes:
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._writer.writerows(rows)
+        return self._buffer.getvalue().encode('utf-8')
+
+    def header(self) -> bytes:
+        return self._encode([self.HEADER])
+
+    def encode(self, rows) -> bytes:
+        return self._encode([timestamp.isoformat(), sensor_id, value, unit]
+                            for timestamp, sensor_id, value, unit in rows)
+
+    def count_rows(self, raw) -> int:
+        return max(0, sum(1 for _ in raw) - 1)
+
+    def iter_rows(self, raw, offset: int = 0):
+        """Zwraca krotki (timestamp, sensor_id, value, unit) od offsetu; pomija uszkodzone wiersze."""
+        if offset:
+            raw.seek(offset)
+        reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8', newline=''))
+        if not offset:
+            next(reader, None)  # nagłówek
+        for row in reader:
+            try:
+                yield datetime.fromisoformat(row[0]), row[1], float(row[2]), row[3]
+            except (ValueError, IndexError):
+                continue  # niepełny lub uszkodzony wiersz
+
+
+class ColumnarStorage:
+    """
+    Format kolumnowy: plik to nagłówek MAGIC i ciąg niezależnych segmentów,
+    po jednym na każdy zapis bufora (lub fragment między wpisami indeksu).
+    Segment zawiera słowniki nazw czujników i jednostek oraz kolumny typowane:
+    znaczniki czasu (int64, mikrosekundy od epoki), kody czujników (uint16),
+    kody jednostek (uint16) i wartości (float64). Kolumny można wczytać
+    bezpośrednio do tablic NumPy (read_columns), bez parsowania tekstu.
+
+    Znaczniki czasu są zapisywane jako czas "ścienny" bez strefy - znaczniki
+    ze strefą są najpierw przeliczane na czas lokalny (jak logger.local_timestamp).
+    """
+
+    name = 'columnar'
+    MAGIC = b'SCOL1\n'
+    SEGMENT = struct.Struct('<4sIHH')  # znacznik, liczba wierszy, rozmiary słowników
+    SEGMENT_MAGIC = b'SEG1'
+    NAME = struct.Struct('<H')
+    COLUMNS = (('timestamp', '<i8'), ('sensor', '<u2'), ('unit', '<u2'), ('value', '<f8'))
+
+    def header(self) -> bytes:
+        return self.MAGIC
+
+    def encode(self, rows) -> bytes:
+        sensors = {}
+        units = {}
+        timestamps = []
+        sensor_codes = []
+        unit_codes = []
+        values = []
+        for timestamp, sensor_id, value, unit in rows:
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone().replace(tzinfo=None)
+            timestamps.append((timestamp - _EPOCH_DATETIME) // _MICROSECOND)
+            # Słowniki przechowują nazwy jako tekst (identyfikator może być liczbą)
+            sensor_codes.append(sensors.setdefault(str(sensor_id), len(sensors)))
+            unit_codes.append(units.setdefault(str(unit), len(units)))
+            values.append(value)
+
+        parts = [self.SEGMENT.pack(self.SEGMENT_MAGIC, len(values), len(sensors), len(units))]
+        for name in list(sensors) + list(units):
+            encoded = name.encode('utf-8')
+            parts.append(self.NAME.pack(len(encoded)) + encoded)
+        for column, (_, dtype) in zip((timestamps, sensor_codes, unit_codes, values), self.COLUMNS):
+            parts.append(np.array(column, dtype=dtype).tobytes())
+        return b''.join(parts)
+
+    def _segments(self, raw, offset: int = 0):
+        """Zwraca kolejne segmenty jako (nazwy czujników, nazwy jednostek, kolumny)."""
+        if offset:
+            raw.seek(offset)
+        elif raw.read(len(self.MAGIC)) != self.MAGIC:
+            raise ValueError("Plik nie jest w formacie kolumnowym")
+        while True:
+            head = raw.read(self.SEGMENT.size)
+            if len(head) < self.SEGMENT.size:
+                return  # koniec pliku (lub niedokończony zapis)
+            magic, count, sensor_count, unit_count = self.SEGMENT.unpack(head)
+            if magic != self.SEGMENT_MAGIC:
+                raise ValueError("Uszkodzony segment pliku kolumnowego")
+            names = []
+            for _ in range(sensor_count + unit_count):
+                (length,) = self.NAME.unpack(raw.read(self.NAME.size))
+                names.append(raw.read(length).decode('utf-8'))
+            columns = {}
+            for column, dtype in self.COLUMNS:
+                size = count * np.dtype(dtype).itemsize
+                data = raw.read(size)
+                if len(data) < size:
+                    return
+                columns[column] = np.frombuffer(data, dtype=dtype)
+            yield names[:sensor_count], names[sensor_count:], columns
+
+    def count_rows(self, raw) -> int:
+        try:
+            return sum(len(columns['value']) for _, _, columns in self._segments(raw))
+        except (ValueError, struct.error):
+            return 0
+
+    def iter_rows(self, raw, offset: int = 0):
+        try:
+            for sensors, units, columns in self._segments(raw, offset):
+                timestamps = (columns['timestamp'].astype('timedelta64[us]') + _EPOCH).tolist()
+                yield from zip(timestamps,
+                               [sensors[code] for code in columns['sensor'].tolist()],
+                               columns['value'].tolist(),
+                               [units[code] for code in columns['unit'].tolist()])
+        except (ValueError, struct.error):
+            return  # uszkodzona końcówka pliku
+
+    def iter_columns(self, raw, offset: int = 0, chunk_rows: Optional[int] = None):
+        """
+        Zwraca plik jako kolejne paczki tablic NumPy (co najmniej chunk_rows wierszy,
+        bez limitu - jedna paczka): timestamp (datetime64[us]), value (float64) oraz
+        kody sensor/unit (uint16) wskazujące na listy nazw sensors/units. Słownik nazw
+        jest wspólny dla całego pliku, więc kody są zgodne między paczkami.
+        """
+        sensors, units = {}, {}
+        parts = {column: [] for column, _ in self.COLUMNS}
+        rows = 0
+        for segment_sensors, segment_units, columns in self._segments(raw, offset):
+            # Słowniki segmentów są lokalne - przekodowanie na wspólny słownik pliku
+            sensor_map = np.array([sensors.setdefault(name, len(sensors)) for name in segment_sensors], dtype='<u2')
+            unit_map = np.array([units.setdefault(name, len(units)) for name in segment_units], dtype='<u2')
+            parts['timestamp'].append(columns['timestamp'])
+            parts['value'].append(columns['value'])
+            parts['sensor'].append(sensor_map[columns['sensor']] if len(sensor_map) else columns['sensor'])
+            parts['unit'].append(unit_map[columns['unit']] if len(unit_map) else columns['unit'])
+            rows += len(columns['value'])
+            if chunk_rows is not None and rows >= chunk_rows:
+                yield self._chunk(parts, sensors, units)
+                parts = {column: [] for column, _ in self.COLUMNS}
+                rows = 0
+        if rows or chunk_rows is None:
+            yield self._chunk(parts, sensors, units)
+
+    def _chunk(self, parts, sensors, units):
+        result = {column: np.concatenate(parts[column]) if parts[column] else np.empty(0, dtype=dtype)
+                  for column, dtype in self.COLUMNS}
+        result['timestamp'] = result['timestamp'].astype('timedelta64[us]') + _EPOCH
+        result['sensors'] = list(sensors)
+        result['units'] = list(units)
+        return result
+
+    def read_columns(self, raw):
+        """Wczytuje cały plik do tablic NumPy (jedna paczka iter_columns)."""
+        return next(self.iter_columns(raw))
+
+
+STORAGE_BACKENDS = {
+    CsvStorage.name: CsvStorage,
+    ColumnarStorage.name: ColumnarStorage,
+}
+
+
+def detect_storage(raw):
+    """Rozpoznaje format pliku po nagłówku; strumień wraca na początek."""
+    head = raw.read(len(ColumnarStorage.MAGIC))
+    raw.seek(0)
+    return ColumnarStorage() if head == ColumnarStorage.MAGIC else CsvStorage()
@@ -1,9 +1,35 @@
+import argparse
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
 import unittest
-from Sensor import Sensor
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import benchmark
+import csvload
+import gorilla
+import query
+import rollup
+from Sensor import Sensor, generate_fleet_batch
 from AirQualitySensor import AirQualitySensor
 from HumiditySensor import HumiditySensor
 from PressureSensor import PressureSensor
 from TemperatureSensor import TemperatureSensor
+from network.client import NetworkClient, QueuedSender
+from network.protocol import HANDSHAKE, HELLO, HELLO_ACK, BinaryEncoder, StreamDecoder, ack, parse_reply
+from network.spool import Spool
+from server.server import NetworkServer
+from logger import Logger, LoggerPipeline, local_timestamp, read_merged_logs
+from server_gui import RingBuffer, SensorDataManager, SensorIngest
+from storage import CsvStorage
+from Observer import Observer, SensorScheduler
 
 
 class TestSensor(unittest.TestCase):
@@ -34,6 +60,32 @@ class TestSensor(unittest.TestCase):
         val2 = self.sensor.get_last_value()
         self.assertEqual(val1, val2)
 
+    def test_generate_batch(self):
+        batches = []
+        self.sensor.register_batch_callback(lambda *args: batches.append(args))
+        values, timestamps = self.sensor.generate_batch(1000)
+        self.assertEqual(values.shape, (1000,))
+        self.assertTrue(((values >= 0) & (values <= 100)).all())
+        self.assertEqual(self.sensor.last_value, values[-1])
+        self.assertEqual(len(batches), 1)
+        self.assertEqual((timestamps[1] - timestamps[0]).astype(int), 1_000_000)
+
+    def test_generate_batch_with_seeded_rng_is_repeatable(self):
+        start = datetime(2025, 1, 1)
+        first, _ = self.sensor.generate_batch(100, start=start, rng=np.random.default_rng(7))
+        second, _ = self.sensor.generate_batch(100, start=start, rng=np.random.default_rng(7))
+        self.assertTrue((first == second).all())
+
+    def test_generate_fleet_batch_respects_ranges(self):
+        temperature = TemperatureSensor(11)
+        temperature.settingSeason('winter')
+        pressure = PressureSensor(12)
+        pressure.settingClimate('plains')
+        values, timestamps = generate_fleet_batch([temperature, pressure], 500)
+        self.assertEqual(values.shape, (2, 500))
+        self.assertTrue((values[0] <= 5).all())
+        self.assertTrue(((values[1] >= 960) & (values[1] <= 1050)).all())
+
 
 class TestAirQualitySensor(unittest.TestCase):
 
@@ -107,5 +159,1032 @@ class TestTemperatureSensor(unittest.TestCase):
             sensor.settingSeason('summer')
 
 
+class AckServer:
+    """Minimalny serwer testowy odpowiadający ACK na każdą linię."""
+
+    def __init__(self, port=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", port))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+        self.connections = 0
+        self.lines = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        buffer = b""
+        with conn:
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    return
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                self.lines.extend(lines)
+                if lines:
+                    conn.sendall(ack(len(lines)))
+
+    def close(self):
+        # shutdown budzi wątek czekający w accept, samo close nie zwalnia portu
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def make_client(port, **options):
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "config.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"client:\n  host: 127.0.0.1\n  port: {port}\n  timeout: 2.0\n  retries: 2\n")
+        for key, value in options.items():
+            f.write(f"  {key}: {value}\n")
+    client = NetworkClient(path)
+    tmp.cleanup()
+    return client
+
+
+class TestNetworkClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = AckServer()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_persistent_connection_is_reused(self):
+        client = make_client(self.server.port, persistent="true")
+        for i in range(5):
+            self.assertTrue(client.send_sensor_data("T-01", float(i), "°C", datetime.now()))
+        client.close()
+        self.assertEqual(self.server.connections, 1)
+
+    def test_send_batch_pipelines_readings(self):
+        client = make_client(self.server.port, persistent="true", batch_size=50)
+        readings = [("H-03", float(i), "%RH", datetime.now()) for i in range(120)]
+        self.assertEqual(client.send_batch(readings), 120)
+        client.close()
+        self.assertEqual(len(self.server.lines), 120)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_queued_sender_does_not_block_sampling(self):
+        client = make_client(self.server.port, persistent="true")
+        sender = QueuedSender(client, max_size=1000)
+        started = time.monotonic()
+        for i in range(200):
+            self.assertTrue(sender.send_sensor_data("T-01", float(i), "°C", datetime.now()))
+        self.assertLess(time.monotonic() - started, 0.5)
+        sender.start()
+        sender.stop()
+        client.close()
+        self.assertEqual(len(self.server.lines), 200)
+
+    def test_queued_sender_backpressure_policies(self):
+        client = make_client(self.server.port, persistent="true")
+        dropping = QueuedSender(client, max_size=3, policy="drop_oldest")
+        for i in range(5):
+            dropping.send_sensor_data("T-01", float(i), "°C", datetime.now())
+        self.assertEqual(dropping.pending(), 3)
+        self.assertEqual(dropping.dropped, 2)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            client = make_client(self.server.port, persistent="true", spool_dir=os.path.join(tmp, "spool"))
+            spilling = QueuedSender(client, max_size=3, policy="spill")
+            for i in range(5):
+                spilling.send_sensor_data("T-01", float(i), "°C", datetime.now())
+            spilling.start()
+            deadline = time.monotonic() + 5
+            while len(self.server.lines) < 5 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            spilling.stop()
+            client.close()
+            self.assertEqual(len(self.server.lines), 5)
+            self.assertTrue(client.spool.is_empty())
+
+    def test_send_fails_without_server(self):
+        port = self.server.port
+        self.server.close()
+        client = make_client(port)
+        self.assertFalse(client.send_sensor_data("P-04", 1000.0, "hPa", datetime.now()))
+
+    def test_circuit_breaker_short_circuits_and_recovers(self):
+        port = free_port()
+        client = make_client(port, retries=3, backoff_base=0.01, breaker_threshold=2,
+                             breaker_reset_timeout=0.3)
+        self.assertFalse(client.send_sensor_data("T-01", 1.0, "°C", datetime.now()))
+        self.assertEqual(client.breaker.state, "open")
+        self.assertEqual(client.breaker.failures, 2)
+        with self.assertLogs(level="WARNING") as logs:
+            self.assertFalse(client.send_sensor_data("T-01", 2.0, "°C", datetime.now()))
+        self.assertEqual(client.breaker.failures, 2)
+        # przy otwartym obwodzie nie było żadnej próby, więc nie ma komunikatu o próbach
+        self.assertTrue(any("Obwód otwarty" in line for line in logs.output), logs.output)
+        self.assertFalse(any("próbach" in line for line in logs.output), logs.output)
+
+        server = AckServer(port)
+        time.sleep(0.35)
+        self.assertTrue(client.send_sensor_data("T-01", 3.0, "°C", datetime.now()))
+        self.assertEqual(client.breaker.state, "closed")
+        server.close()
+
+
+class TestProtocol(unittest.TestCase):
+
+    def test_binary_frames_round_trip_in_fragments(self):
+        encoder = BinaryEncoder()
+        readings = [("T-01", 21.5, "°C", datetime(2025, 5, 1, 12, 0, 0, 123456)),
+                    ("H-03", 55.25, "%RH", datetime(2025, 5, 1, 12, 0, 1)),
+                    ("T-01", -3.0, "°C", datetime(2025, 5, 1, 10, 0, tzinfo=timezone.utc))]
+        stream = HELLO + b"".join(encoder.encode(*reading) for reading in readings)
+        self.assertLess(len(stream), 3 * 60)
+
+        decoder = StreamDecoder()
+        items = []
+        for i in range(0, len(stream), 7):
+            items.extend(decoder.feed(stream[i:i + 7]))
+        self.assertIs(items[0], HANDSHAKE)
+        decoded = [(r["sensor_id"], r["value"], r["unit"], r["timestamp"]) for r in items[1:]]
+        self.assertEqual(decoded, readings)
+
+    def test_numeric_sensor_id_is_sent_as_text(self):
+        encoder = BinaryEncoder()
+        timestamp = datetime(2025, 5, 1, 12, 0)
+        stream = HELLO + encoder.encode(7, 1.0, "°C", timestamp) + encoder.encode("7", 2.0, "°C", timestamp)
+        items = StreamDecoder().feed(stream)
+        self.assertEqual([(r["sensor_id"], r["value"]) for r in items[1:]], [("7", 1.0), ("7", 2.0)])
+        # ten sam identyfikator jako liczba i jako tekst ma jedną definicję
+        self.assertEqual(len(encoder._sensors), 1)
+
+    def test_process_sends_one_cumulative_ack(self):
+        encoder = BinaryEncoder()
+        lines = b"".join(NetworkClient._encode("T-01", float(i), "°C", datetime.now()) for i in range(3))
+        frames = b"".join(encoder.encode("T-01", float(i), "°C", datetime.now()) for i in range(4))
+        handled = []
+        decoder = StreamDecoder(on_error=lambda e: None)
+        reply = decoder.process(memoryview(lines + b"not json\n" + HELLO + frames[:-5]), handled.append)
+        self.assertEqual(reply, b"ACK 3\nNAK\n" + HELLO_ACK + b"ACK 3\n")
+        self.assertEqual(decoder.process(frames[-5:], handled.append), b"ACK\n")
+        self.assertEqual([r["value"] for r in handled], [0.0, 1.0, 2.0, 0.0, 1.0, 2.0, 3.0])
+
+    def test_rejected_messages_keep_their_place_in_replies(self):
+        lines = [NetworkClient._encode("T-01", value, "°C", datetime.now()) for value in (1.0, 2.0, -1.0, 3.0)]
+        handled = []
+
+        def handle(reading):
+            if reading["value"] < 0:
+                raise ValueError("ujemna wartość")
+            handled.append(reading["value"])
+
+        reply = StreamDecoder(on_error=lambda e: None).process(b"".join(lines) + b"not json\n", handle)
+        self.assertEqual(reply, b"ACK 2\nNAK\nACK\nNAK\n")
+        self.assertEqual([parse_reply(line) for line in reply.splitlines()], [(2, 0), (0, 1), (1, 0), (0, 1)])
+        self.assertEqual(handled, [1.0, 2.0, 3.0])
+
+
+class TestSensorDataManager(unittest.TestCase):
+
+    def test_rolling_windows_match_full_scan(self):
+        manager = SensorDataManager()
+        now = datetime.now()
+        readings = [(now - timedelta(seconds=(3000 - i) * 20), float(i % 97)) for i in range(3000)]
+        for timestamp, value in readings:
+            manager.add_reading("T-01", value, "°C", timestamp)
+
+        # 3h i 0.5h nie mają okna kroczącego - liczone są jednym przebiegiem po historii
+        for hours in (1, 12, 3, 0.5):
+            cutoff = datetime.now() - timedelta(hours=hours)
+            recent = [value for timestamp, value in readings if timestamp >= cutoff]
+            self.assertAlmostEqual(manager.get_average("T-01", hours), sum(recent) / len(recent))
+            self.assertEqual(manager.get_min("T-01", hours), min(recent))
+            self.assertEqual(manager.get_max("T-01", hours), max(recent))
+        self.assertIsNone(manager.get_average("unknown", 1))
+        self.assertIsNone(manager.get_average("unknown", 3))
+        self.assertEqual(len(manager.get_window("T-01", 3)[1]),
+                         len([t for t, _ in readings if t >= datetime.now() - timedelta(hours=3)]))
+
+        timestamps, values = manager.get_window("T-01", 1)
+        self.assertEqual(values.dtype.name, "float64")
+        self.assertEqual(timestamps.dtype.name, "int64")
+        self.assertEqual(len(values), len([t for t, _ in readings if t >= datetime.now() - timedelta(hours=1)]))
+
+    def test_pop_dirty_returns_only_changed_sensors(self):
+        manager = SensorDataManager()
+        now = datetime.now()
+        for sensor_id in ("T-01", "H-02", "P-03"):
+            manager.add_reading(sensor_id, 1.0, "u", now)
+        self.assertEqual(sorted(manager.pop_dirty()), ["H-02", "P-03", "T-01"])
+        self.assertEqual(manager.pop_dirty(), [])
+
+        manager.add_reading("H-02", 2.0, "u", now)
+        manager.add_reading("H-02", 3.0, "u", now)
+        self.assertEqual(manager.pop_dirty(), ["H-02"])
+        self.assertEqual(manager.pop_dirty(), [])
+
+    def test_ring_buffer_wraps_around(self):
+        buffer = RingBuffer(10)
+        for i in range(23):
+            buffer.append(i, float(i))
+        self.assertEqual(buffer.start, 13)
+        self.assertEqual(list(buffer.slice(0, 23)[1]), [float(i) for i in range(13, 23)])
+        self.assertEqual(list(buffer.slice(18, 22)[0]), [18, 19, 20, 21])
+
+
+class RecordingSink:
+    """Zastępuje Logger i NetworkClient w testach obserwatorów."""
+
+    def __init__(self):
+        self.readings = []
+
+    def log_reading(self, timestamp, sensor_id, value, unit):
+        self.readings.append((sensor_id, timestamp))
+
+    def send_sensor_data(self, sensor_id, value, unit, timestamp):
+        return True
+
+
+class RecordingScheduler(SensorScheduler):
+    """Planista zapamiętujący terminy wykonanych odczytów każdego sensora."""
+
+    def __init__(self, workers=4):
+        super().__init__(workers)
+        self.deadlines = {}
+
+    def _reschedule(self, observer, token, deadline):
+        self.deadlines.setdefault(observer.sensor.sensor_id, []).append(deadline)
+        super()._reschedule(observer, token, deadline)
+
+
+class TestSensorScheduler(unittest.TestCase):
+
+    def test_drives_many_observers_from_one_scheduler(self):
+        scheduler = RecordingScheduler(workers=2)
+        sink = RecordingSink()
+        observers = [Observer(Sensor(f"S-{i}", "s", "u", 0, 1, frequency=0.05), sink, sink, scheduler)
+                     for i in range(50)]
+        for observer in observers:
+            observer.start()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and (len(scheduler.deadlines) < 50 or
+                                               min(map(len, scheduler.deadlines.values())) < 4):
+            time.sleep(0.02)
+        for observer in observers:
+            observer.stop()
+        count = len(sink.readings)
+        time.sleep(0.1)
+        scheduler.stop()
+
+        self.assertEqual(len(sink.readings), count)
+        self.assertEqual(len(scheduler.deadlines), 50)
+        for sensor_id, deadlines in scheduler.deadlines.items():
+            self.assertGreaterEqual(len(deadlines), 4, sensor_id)
+            # kolejne terminy rosną o wielokrotność okresu (zaległe terminy są pomijane, nie nadrabiane)
+            for previous, current in zip(deadlines, deadlines[1:]):
+                periods = (current - previous) / 0.05
+                self.assertGreaterEqual(round(periods), 1, sensor_id)
+                self.assertAlmostEqual(periods, round(periods), places=6, msg=sensor_id)
+
+    def test_rejects_sensor_without_frequency(self):
+        scheduler = SensorScheduler(workers=1)
+        sink = RecordingSink()
+        observer = Observer(Sensor("S-0", "s", "u", 0, 1, frequency=0), sink, sink, scheduler)
+        with self.assertRaises(ValueError):
+            observer.start()
+        scheduler.stop()
+
+
+class TestSpool(unittest.TestCase):
+
+    def test_segments_commit_and_limit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spool = Spool(tmp, segment_max_bytes=500, max_total_bytes=100000)
+            readings = [("T-01", float(i), "°C", datetime(2025, 6, 3, 12, 0, i)) for i in range(30)]
+            for reading in readings:
+                spool.append([reading])
+            self.assertGreater(len(os.listdir(tmp)), 2)
+
+            records = spool.read(10)
+            self.assertEqual([r for r, _ in records], readings[:10])
+            spool.commit(records[-1][1])
+
+            # po ponownym otwarciu odczyt zaczyna się od zatwierdzonej pozycji
+            spool = Spool(tmp, segment_max_bytes=500, max_total_bytes=100000)
+            records = spool.read(100)
+            self.assertEqual([r for r, _ in records], readings[10:])
+            spool.commit(records[-1][1])
+            self.assertTrue(spool.is_empty())
+
+            limited = Spool(os.path.join(tmp, "limited"), segment_max_bytes=500, max_total_bytes=1000)
+            for reading in readings:
+                limited.append([reading])
+            remaining = [r for r, _ in limited.read(100)]
+            self.assertLess(len(remaining), 30)
+            self.assertEqual(remaining, readings[-len(remaining):])
+
+    def test_client_replays_spool_after_outage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            port = free_port()
+            client = make_client(port, persistent="true", retries=1, replay_retry_interval=0.1,
+                                 breaker_reset_timeout=0.1, spool_dir=os.path.join(tmp, "spool"))
+            readings = [("H-03", float(i), "%RH", datetime.now()) for i in range(20)]
+            self.assertEqual(client.send_batch(readings), 0)
+            self.assertFalse(client.spool.is_empty())
+
+            server = AckServer(port)
+            deadline = time.monotonic() + 5
+            while not client.spool.is_empty() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            client.close()
+            server.close()
+            values = [json.loads(line)["value"] for line in server.lines]
+            self.assertEqual(values, [float(i) for i in range(20)])
+            self.assertTrue(client.spool.is_empty())
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def write_logger_config(directory, **overrides):
+    config = {
+        "log_dir": os.path.join(directory, "logs"),
+        "filename_pattern": "sensors_%Y%m%d.csv",
+        "buffer_size": 1,
+        "rotate_every_hours": 24,
+        "max_size_mb": 15,
+        "rotate_after_lines": 10000,
+        "retention_days": 10
+    }
+    config.update(overrides)
+    path = os.path.join(directory, "config.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    return path
+
+
+class TestLoggerRotation(unittest.TestCase):
+
+    def test_size_is_tracked_in_memory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, buffer_size=3))
+            logger.start()
+            for i in range(10):
+                logger.log_reading(datetime.now(), "T-01", i * 1.5, "°C")
+            logger.stop()
+            self.assertEqual(logger.current_size_bytes, os.path.getsize(logger.current_filename))
+            self.assertEqual(logger.current_line_count, 10)
+
+    def test_rotation_after_lines(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, rotate_after_lines=5))
+            logger.start()
+            for i in range(7):
+                logger.log_reading(datetime.now(), "T-01", float(i), "°C")
+            logger.stop()
+            self.assertEqual(logger.current_line_count, 2)
+            archives = [name for name in os.listdir(os.path.join(tmp, "logs", "archive")) if name.endswith(".zip")]
+            self.assertEqual(len(archives), 1)
+
+    def test_background_archives_keep_every_rotation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, rotate_after_lines=3, archive_codec="lzma"))
+            logger.start()
+            for i in range(10):
+                logger.log_reading(datetime.now(), "T-01", float(i), "°C")
+            logger.stop()
+            self.assertFalse(any(t.name.startswith("logger-archiver") for t in threading.enumerate()))
+
+            archive_dir = os.path.join(tmp, "logs", "archive")
+            archives = sorted(name for name in os.listdir(archive_dir) if name.endswith(".zip"))
+            self.assertEqual(len(archives), 3)
+            rows = 0
+            for name in archives:
+                with zipfile.ZipFile(os.path.join(archive_dir, name)) as zipf:
+                    rows += len(zipf.read(zipf.namelist()[0]).splitlines()) - 1
+            self.assertEqual(rows, 9)
+
+
+class TestLoggerReadLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logger = Logger(write_logger_config(self.tmp.name, buffer_size=5, rotate_after_lines=20))
+        self.logger.start()
+        self.base = datetime(2025, 6, 3, 12, 0, 0)
+        for i in range(50):
+            sensor_id = "T-01" if i % 2 == 0 else "H-03"
+            self.logger.log_reading(self.base + timedelta(minutes=i), sensor_id, float(i), "u")
+        self.logger.wait_for_archives()
+
+    def tearDown(self):
+        self.logger.stop()
+        self.tmp.cleanup()
+
+    def test_reads_live_and_archived_files(self):
+        entries = list(self.logger.read_logs(self.base, self.base + timedelta(hours=2)))
+        self.assertEqual(len(entries), 50)
+        self.assertEqual(entries[0]["timestamp"], self.base)
+        self.assertIsInstance(entries[0]["value"], float)
+
+    def test_filters_range_and_sensor(self):
+        start = self.base + timedelta(minutes=10)
+        end = self.base + timedelta(minutes=29)
+        entries = list(self.logger.read_logs(start, end, sensor_id="H-03"))
+        self.assertEqual([e["value"] for e in entries], [float(i) for i in range(11, 30, 2)])
+
+    def test_skips_files_outside_range_using_sidecars(self):
+        opened = []
+        iter_rows = self.logger._iter_rows
+        self.logger._iter_rows = lambda path, *args: opened.append(path) or iter_rows(path, *args)
+        entries = list(self.logger.read_logs(self.base + timedelta(minutes=45), self.base + timedelta(hours=1)))
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(len(opened), 1)
+
+
+class TestLoggerIndex(unittest.TestCase):
+
+    def test_seeks_to_range_start(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, buffer_size=7, index_every_rows=10))
+            logger.start()
+            base = datetime(2025, 6, 3, 12, 0, 0)
+            for i in range(200):
+                # lekko nieuporządkowane znaczniki czasu, jak przy wielu klientach
+                jitter = 2 if i % 5 == 0 else 0
+                logger.log_reading(base + timedelta(seconds=i - jitter), f"S-{i % 3}", float(i), "u")
+            logger.stop()
+
+            start = base + timedelta(seconds=150)
+            offset = logger._index_offset(logger.current_filename, start)
+            self.assertGreater(offset, 0)
+            with open(logger.current_filename, "rb") as f:
+                head = f.read(offset).decode("utf-8").splitlines()[1:]
+            self.assertTrue(all(datetime.fromisoformat(line.split(",")[0]) < start for line in head))
+
+            expected = [float(i) for i in range(200) if i - (2 if i % 5 == 0 else 0) >= 150]
+            values = [e["value"] for e in logger.read_logs(start, base + timedelta(hours=1))]
+            self.assertEqual(sorted(values), expected)
+            self.assertEqual(list(logger.read_logs(base, start, sensor_id="S-9")), [])
+
+    def test_mixed_naive_and_aware_timestamps(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, buffer_size=100))
+            logger.start()
+            naive = datetime(2025, 6, 3, 12, 0, 0)
+            aware = datetime(2025, 6, 3, 10, 0, 1, tzinfo=timezone.utc)
+            logger.log_reading(naive, "S-1", 1.0, "u")
+            logger.log_reading(aware, "S-2", 2.0, "u")
+            logger._flush()
+            self.assertEqual(logger.buffer, [])
+            logger.log_reading(naive + timedelta(seconds=2), "S-1", 3.0, "u")
+            logger.stop()
+
+            entries = list(logger.read_logs(aware - timedelta(hours=1), naive + timedelta(days=1)))
+            self.assertEqual(sorted(e["value"] for e in entries), [1.0, 2.0, 3.0])
+            stored = next(e["timestamp"] for e in entries if e["sensor_id"] == "S-2")
+            self.assertIsNone(stored.tzinfo)
+            self.assertEqual(stored, aware.astimezone().replace(tzinfo=None))
+
+    def test_non_numeric_value_leaves_no_trace(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, buffer_size=100))
+            logger.start()
+            base = datetime(2025, 6, 3, 12, 0, 0)
+            logger.log_reading(base, "S-1", 1.0, "u")
+            with self.assertRaises(ValueError):
+                logger.log_reading(base + timedelta(seconds=1), "S-1", "abc", "u")
+            self.assertEqual(len(logger.buffer), 1)
+            self.assertEqual(logger._sensor_counts, {"S-1": 1})
+            logger.stop()
+
+            with open(logger.current_filename, encoding="utf-8") as f:
+                self.assertNotIn("abc", f.read())
+
+
+class TestColumnarStorage(unittest.TestCase):
+
+    def test_columnar_logger_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, buffer_size=7, index_every_rows=10, storage="columnar",
+                                                rotate_after_lines=119))
+            logger.start()
+            base = datetime(2025, 6, 3, 12, 0, 0, 500)
+            for i in range(200):
+                logger.log_reading(base + timedelta(seconds=i), f"S-{i % 3}", i / 4, "°C" if i % 2 else "%RH")
+            logger.stop()
+
+            entries = list(logger.read_logs(base + timedelta(seconds=150), base + timedelta(hours=1)))
+            self.assertEqual([e["value"] for e in entries], [i / 4 for i in range(150, 200)])
+            self.assertEqual(entries[0]["timestamp"], base + timedelta(seconds=150))
+            self.assertEqual(entries[1]["unit"], "°C")
+            self.assertGreater(logger._index_offset(logger.current_filename, base + timedelta(seconds=190)), 0)
+
+            with open(logger.current_filename, "rb") as f:
+                columns = logger.storage.read_columns(f)
+            self.assertEqual(columns["value"].tolist(), [i / 4 for i in range(119, 200)])
+            self.assertEqual([columns["sensors"][c] for c in columns["sensor"][:3]], ["S-2", "S-0", "S-1"])
+            self.assertEqual(columns["timestamp"][0], np.datetime64(base + timedelta(seconds=119), "us"))
+
+    def test_numeric_sensor_id_is_stored_as_text(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, storage="columnar", archive_in_background=False))
+            logger.start()
+            base = datetime(2025, 6, 3, 12, 0)
+            logger.log_reading(base, 7, 1.0, "°C")
+            logger.log_reading(base + timedelta(seconds=1), 7, 2.0, "°C")
+            logger.stop()
+
+            entries = list(logger.read_logs(base, base + timedelta(minutes=1)))
+            self.assertEqual([(e["sensor_id"], e["value"]) for e in entries], [("7", 1.0), ("7", 2.0)])
+
+    def test_switching_format_sets_existing_file_aside(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp))
+            logger.start()
+            logger.log_reading(datetime.now(), "T-01", 1.0, "°C")
+            logger.stop()
+
+            logger = Logger(write_logger_config(tmp, storage="columnar", archive_in_background=False))
+            logger.start()
+            logger.log_reading(datetime.now(), "T-01", 2.0, "°C")
+            logger.stop()
+            values = [e["value"] for e in logger.read_logs(datetime.now() - timedelta(hours=1), datetime.now())]
+            self.assertEqual(values, [1.0, 2.0])
+
+
+class TestGorillaArchive(unittest.TestCase):
+
+    def test_series_codec_is_lossless(self):
+        timestamps = [1_700_000_000_000_000 + i * 1_000_000 + (i % 7) * 37 - (10 ** 10 if i == 5 else 0)
+                      for i in range(300)]
+        values = [20.5, 20.5, -0.0, float("inf"), 1e-300] + [20 + (i % 10) / 8 for i in range(295)]
+        data = gorilla.encode_series(timestamps, values)
+        self.assertLess(len(data), 300 * 16)
+        self.assertEqual(gorilla.decode_series(data, len(values)), (timestamps, values))
+
+    def test_numeric_sensor_id_is_archived_as_text(self):
+        buffer = io.BytesIO()
+        base = datetime(2025, 7, 1, 8, 0)
+        gorilla.write_archive([(base, 7, 1.0, "°C"), (base + timedelta(seconds=1), "7", 2.0, "°C")], buffer)
+        buffer.seek(0)
+        series = [(sensor_id, unit, values) for sensor_id, unit, _, values in gorilla.iter_series(buffer)]
+        self.assertEqual(series, [("7", "°C", [1.0, 2.0])])
+
+    def test_logger_archives_and_reads_tsz(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, buffer_size=10, rotate_after_lines=50, index_every_rows=20,
+                                                archive_format="tsz", archive_in_background=False))
+            logger.start()
+            base = datetime(2025, 7, 1, 8, 0, 0)
+            for i in range(120):
+                logger.log_reading(base + timedelta(seconds=i // 2, microseconds=i % 3),
+                                   f"S-{i % 2}", 21.0 + (i // 10) / 4, "°C")
+            logger.stop()
+
+            archives = sorted(os.listdir(os.path.join(tmp, "logs", "archive")))
+            self.assertIn(os.path.basename(logger.current_filename) + ".tsz", archives)
+            self.assertFalse(any(name.endswith(".idx") for name in archives))
+            entries = [(e["timestamp"], e["sensor_id"], e["value"])
+                       for e in logger.read_logs(base, base + timedelta(hours=1))]
+            expected = [(base + timedelta(seconds=i // 2, microseconds=i % 3), f"S-{i % 2}", 21.0 + (i // 10) / 4)
+                        for i in range(120)]
+            self.assertEqual(sorted(entries), sorted(expected))
+            # Szeregi archiwum są scalane po czasie
+            archived = entries[:100]
+            self.assertEqual(archived, sorted(archived, key=lambda entry: entry[0]))
+
+
+class TestRollups(unittest.TestCase):
+
+    def test_tiers_match_raw_aggregation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, buffer_size=50))
+            logger.start()
+            base = datetime(2025, 8, 1, 10, 0, 0)
+            for i in range(1080):
+                logger.log_reading(base + timedelta(seconds=10 * i), f"S-{i % 2}", float(i % 37), "u")
+
+            start, end = base, base + timedelta(hours=3) - timedelta(microseconds=1)
+            self.assertEqual(rollup.select_tier(timedelta(hours=2))[0], "1h")
+            self.assertEqual(rollup.select_tier(timedelta(minutes=15))[0], "1m")
+            self.assertIsNone(rollup.select_tier(timedelta(seconds=30)))
+            for resolution in (timedelta(hours=1), timedelta(minutes=15)):
+                # Otwarte przedziały (przed stop) też są uwzględniane
+                from_tiers = logger.read_aggregates(start, end, resolution)
+                from_raw = rollup.aggregate_readings(logger.read_logs(start, end), resolution)
+                self.assertEqual(from_tiers, from_raw)
+            logger.stop()
+
+            self.assertTrue(os.path.exists(os.path.join(tmp, "logs", "rollups", "rollup_1h_202508.csv")))
+            hourly = logger.read_aggregates(start, end, timedelta(hours=1), sensor_id="S-1")
+            self.assertEqual([(a["bucket"].hour, a["count"]) for a in hourly], [(10, 180), (11, 180), (12, 180)])
+            self.assertEqual(hourly[0]["last"], float(359 % 37))
+            self.assertEqual(len(logger.read_aggregates(start, end, timedelta(seconds=30))), 720)
+
+    def test_falls_back_to_raw_logs_outside_rollup_coverage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = datetime(2025, 8, 1, 10, 0, 0)
+            # Pierwsze półtorej godziny zapisane bez agregatów
+            logger = Logger(write_logger_config(tmp, buffer_size=50, rollups=False))
+            logger.start()
+            for i in range(540):
+                logger.log_reading(base + timedelta(seconds=10 * i), f"S-{i % 2}", float(i % 37), "u")
+            logger.stop()
+
+            logger = Logger(write_logger_config(tmp, buffer_size=50, retention_days=1))
+            logger.start()
+            for i in range(540, 1080):
+                logger.log_reading(base + timedelta(seconds=10 * i + 5), f"S-{i % 2}", float(i % 37), "u")
+            logger.stop()
+            rollups_dir = os.path.join(tmp, "logs", "rollups")
+            self.assertEqual(rollup.read_coverage(rollups_dir),
+                             {"1m": base + timedelta(minutes=91), "1h": base + timedelta(hours=2)})
+
+            start, end = base, base + timedelta(hours=3) - timedelta(microseconds=1)
+            for resolution in (timedelta(hours=1), timedelta(minutes=15), timedelta(days=1)):
+                from_raw = rollup.aggregate_readings(logger.read_logs(start, end), resolution)
+                self.assertEqual(logger.read_aggregates(start, end, resolution), from_raw)
+
+            # Po usunięciu pliku tieru jego okres jest liczony z surowych odczytów
+            minute_file = os.path.join(rollups_dir, "rollup_1m_20250801.csv")
+            expired = time.time() - 3 * 86400
+            os.utime(minute_file, (expired, expired))
+            logger._old_archive_delete()
+            self.assertFalse(os.path.exists(minute_file))
+            self.assertEqual(rollup.read_coverage(rollups_dir)["1m"], datetime(2025, 8, 2))
+            from_raw = rollup.aggregate_readings(logger.read_logs(start, end), timedelta(minutes=15))
+            self.assertEqual(logger.read_aggregates(start, end, timedelta(minutes=15)), from_raw)
+
+    def test_retention_prunes_old_rollup_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, retention_days=1))
+            rollups_dir = os.path.join(tmp, "logs", "rollups")
+            old_path = os.path.join(rollups_dir, "rollup_1m_20200101.csv")
+            fresh_path = os.path.join(rollups_dir, "rollup_1h_202001.csv")
+            for path in (old_path, fresh_path):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(",".join(rollup.HEADER) + "\n")
+            expired = time.time() - 3 * 86400
+            os.utime(old_path, (expired, expired))
+
+            logger._old_archive_delete()
+            self.assertFalse(os.path.exists(old_path))
+            self.assertTrue(os.path.exists(fresh_path))
+
+    def test_numeric_and_text_sensor_ids_share_a_bucket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp))
+            logger.start()
+            base = datetime(2025, 8, 1, 10, 0, 0)
+            logger.log_reading(base, 7, 1.0, "u")
+            logger.log_reading(base + timedelta(seconds=1), "7", 3.0, "u")
+            logger.stop()
+
+            hourly = logger.read_aggregates(base, base + timedelta(hours=1), timedelta(hours=1))
+            self.assertEqual([(a["sensor_id"], a["count"]) for a in hourly], [("7", 2)])
+
+
+class TestCsvLoad(unittest.TestCase):
+
+    def write_log(self, directory):
+        storage = CsvStorage()
+        rows = [(datetime(2025, 3, 1) + timedelta(seconds=i, microseconds=(i % 3) * 250), f"S-{i % 4}",
+                 i / 8, "°C") for i in range(500)]
+        rows.append((datetime(2025, 3, 1, 12, tzinfo=timezone(timedelta(hours=2))), "S-0", 1.5, "°C"))
+        rows.append((datetime(2025, 3, 1, 13), "S,quoted", 2.5, "hPa"))
+        path = os.path.join(directory, "sensors.csv")
+        with open(path, "wb") as f:
+            f.write(storage.header() + storage.encode(rows))
+            f.write(b"2025-02-30T00:00:00,S-0,1,C\r\nbroken line\r\n2025-03-02T00:00:00,S-9,oops,C\r\n"
+                    b"2025-03-02T00:00:01,S-9,3.25,C")  # ostatni wiersz bez znaku nowej linii
+        return path
+
+    @staticmethod
+    def as_rows(chunk):
+        return sorted(zip(chunk["timestamp"].astype(datetime).tolist(),
+                          [chunk["sensors"][code] for code in chunk["sensor"]],
+                          chunk["value"].tolist(),
+                          [chunk["units"][code] for code in chunk["unit"]]))
+
+    def test_matches_csv_reader(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.write_log(tmp)
+            with open(path, "rb") as raw:
+                expected = sorted((local_timestamp(ts), sensor, value, unit)
+                                  for ts, sensor, value, unit in CsvStorage().iter_rows(raw))
+            loaded = csvload.load_csv(path)
+            self.assertEqual(self.as_rows(loaded), expected)
+            self.assertEqual(len(expected), 503)
+            self.assertEqual(loaded["timestamp"].dtype, np.dtype("datetime64[us]"))
+
+    def test_byte_ranges_partition_rows(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.write_log(tmp)
+            whole = self.as_rows(csvload.load_csv(path))
+            size = os.path.getsize(path)
+            for chunk_bytes in (1, 37, 1000, size):
+                ranges = csvload.byte_ranges(size, chunk_bytes)
+                chunks = [csvload.load_csv(path, start, end) for start, end in ranges]
+                self.assertEqual(self.as_rows(csvload.concat_chunks(chunks)), whole)
+            self.assertEqual(self.as_rows(csvload.load_csv_parallel(path, workers=2)), whole)
+
+
+class TestQuery(unittest.TestCase):
+
+    def test_vectorised_aggregates_match_raw_readings(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = write_logger_config(tmp, buffer_size=50, rotate_after_lines=300, archive_format="tsz",
+                                         archive_in_background=False)
+            logger = Logger(config)
+            logger.start()
+            base = datetime(2025, 8, 1, 10, 0, 0)
+            for i in range(1000):
+                logger.log_reading(base + timedelta(seconds=7 * i), f"S-{i % 3}", float((i * 13) % 101), "u")
+            logger.stop()
+
+            start, end = base + timedelta(minutes=5), base + timedelta(minutes=95)
+            resolution = timedelta(minutes=10)
+            result = query.aggregate(config, start, end, resolution, percentiles=(50, 95), chunk_rows=128)
+            readings = list(logger.read_logs(start, end))
+            expected = rollup.aggregate_readings(readings, resolution)
+
+            self.assertEqual(len(result["count"]), len(expected))
+            self.assertEqual([(b.astype(datetime), s) for b, s in zip(result["bucket"], result["sensor_id"])],
+                             [(a["bucket"], a["sensor_id"]) for a in expected])
+            self.assertEqual(result["count"].tolist(), [a["count"] for a in expected])
+            np.testing.assert_allclose(result["mean"], [a["mean"] for a in expected])
+            self.assertEqual(result["max"].tolist(), [a["max"] for a in expected])
+            first = [r["value"] for r in readings
+                     if r["sensor_id"] == "S-0" and rollup.bucket_start(r["timestamp"], resolution) == expected[0]["bucket"]]
+            self.assertAlmostEqual(result["p95"][0], np.percentile(first, 95))
+
+            sensor = query.aggregate(config, start, end, resolution, sensor_id="S-1")
+            self.assertEqual(set(sensor["sensor_id"].tolist()), {"S-1"})
+
+    def test_legacy_aware_rows_match_read_logs(self):
+        previous = os.environ.get("TZ")
+        os.environ["TZ"] = "Europe/Warsaw"
+        time.tzset()
+        self.addCleanup(time.tzset)
+        self.addCleanup(lambda: os.environ.pop("TZ") if previous is None else os.environ.update(TZ=previous))
+        with tempfile.TemporaryDirectory() as tmp:
+            config = write_logger_config(tmp)
+            os.makedirs(os.path.join(tmp, "logs"))
+            # Plik zapisany przed normalizacją znaczników czasu - ze strefą UTC
+            with open(os.path.join(tmp, "logs", "sensors_20250801.csv"), "w", encoding="utf-8") as f:
+                f.write("timestamp,sensor_id,value,unit\n2025-08-01T12:00:00+00:00,S-0,1.5,u\n")
+            start, end = datetime(2025, 8, 1), datetime(2025, 8, 2)
+
+            entries = list(Logger(config).read_logs(start, end))
+            self.assertEqual([e["timestamp"] for e in entries], [datetime(2025, 8, 1, 14)])
+            result = query.aggregate(config, start, end, timedelta(hours=1))
+            self.assertEqual([b.astype(datetime) for b in result["bucket"]], [datetime(2025, 8, 1, 14)])
+
+    def test_resolution_parsing(self):
+        self.assertEqual(query.parse_resolution("15m"), timedelta(minutes=15))
+        self.assertEqual(query.parse_resolution("500ms"), timedelta(milliseconds=500))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            query.parse_resolution("1w")
+
+
+class TestLoggerGroupCommit(unittest.TestCase):
+
+    def test_background_flush_after_interval(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, buffer_size=1000, flush_interval_ms=50, fsync="flush"))
+            logger.start()
+            for i in range(5):
+                logger.log_reading(datetime.now(), "H-03", float(i), "%RH")
+            time.sleep(0.3)
+            with open(logger.current_filename, encoding="utf-8") as f:
+                self.assertEqual(sum(1 for _ in f) - 1, 5)
+            logger.stop()
+
+
+class TestLoggerPipeline(unittest.TestCase):
+
+    def test_concurrent_writers_share_one_logger(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp, buffer_size=10))
+            logger.start()
+            pipeline = LoggerPipeline(logger)
+            pipeline.start()
+
+            def produce(sensor_id):
+                for i in range(100):
+                    pipeline.log_reading(datetime.now(), sensor_id, float(i), "u")
+
+            threads = [threading.Thread(target=produce, args=(f"S-{n}",)) for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            pipeline.stop()
+            logger.stop()
+
+            with open(logger.current_filename, encoding="utf-8") as f:
+                self.assertEqual(sum(1 for _ in f) - 1, 400)
+
+    def test_rejects_readings_after_stop(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = Logger(write_logger_config(tmp))
+            logger.start()
+            pipeline = LoggerPipeline(logger)
+            pipeline.start()
+            pipeline.log_reading(datetime.now(), "S-0", 1.0, "u")
+            pipeline.stop()
+            with self.assertRaises(RuntimeError):
+                pipeline.log_reading(datetime.now(), "S-0", 2.0, "u")
+            logger.stop()
+
+            with open(logger.current_filename, encoding="utf-8") as f:
+                self.assertEqual(sum(1 for _ in f) - 1, 1)
+
+
+class TestSensorIngest(unittest.TestCase):
+
+    def test_stop_disconnects_clients_before_stopping_pipeline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ingest = SensorIngest()
+            ingest.start_logging(write_logger_config(tmp))
+            ingest.is_running = True
+            server_side, client_side = socket.socketpair()
+            ingest.serve_client(server_side, "socketpair")
+
+            client_side.sendall(NetworkClient._encode("T-01", 1.0, "°C", datetime.now()))
+            self.assertEqual(client_side.recv(64), b"ACK\n")
+            log_file = ingest.logger.current_filename
+            ingest.stop_clients()
+            ingest.stop_logging()
+
+            # Odczyt wysłany po zatrzymaniu nie jest potwierdzany
+            try:
+                client_side.sendall(NetworkClient._encode("T-01", 2.0, "°C", datetime.now()))
+                self.assertEqual(client_side.recv(64), b"")
+            except OSError:
+                pass
+            client_side.close()
+            with open(log_file, encoding="utf-8") as f:
+                self.assertEqual(sum(1 for _ in f) - 1, 1)
+
+
+class TestAsyncNetworkServer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.port = free_port()
+        yaml_path = os.path.join(self.tmp.name, "config.yaml")
+        with open(yaml_path, "w", encoding="utf-8") as f:
+            f.write(f"server:\n  host: 127.0.0.1\n  port: {self.port}\n  mode: async\n"
+                    f"  log_path: {os.path.join(self.tmp.name, 'logs')}\n")
+        self.server = NetworkServer(yaml_path, write_logger_config(self.tmp.name))
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.server.serve, args=(self.stop_event,), daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.stop_event.set()
+        self.thread.join(5)
+        self.tmp.cleanup()
+
+    def test_serves_concurrent_persistent_clients(self):
+        clients = [make_client(self.port, persistent="true") for _ in range(3)]
+        wait_for_port(self.port)
+
+        # Pierwsze połączenia pozostają otwarte, a kolejni klienci nadal są obsługiwani
+        for i, client in enumerate(clients):
+            self.assertTrue(client.send_sensor_data(f"S-{i}", 1.0, "u", datetime.now()))
+        for i, client in enumerate(clients):
+            self.assertEqual(client.send_batch([(f"S-{i}", 2.0, "u", datetime.now())] * 10), 10)
+            client.close()
+
+        self.stop_event.set()
+        self.thread.join(5)
+        log_file = self.server.logger.current_filename
+        with open(log_file, encoding="utf-8") as f:
+            self.assertEqual(sum(1 for _ in f) - 1, 33)
+
+    def test_negotiates_binary_protocol(self):
+        client = make_client(self.port, persistent="true", protocol="binary")
+        wait_for_port(self.port)
+        timestamp = datetime(2025, 5, 1, 12, 0, 0, 250000)
+        self.assertEqual(client.send_batch([("P-04", 1013.25, "hPa", timestamp)] * 5), 5)
+        self.assertIsNotNone(client._encoder)
+        client.close()
+
+        self.stop_event.set()
+        self.thread.join(5)
+        with open(self.server.logger.current_filename, encoding="utf-8") as f:
+            rows = f.read().splitlines()[1:]
+        self.assertEqual(rows, [f"{timestamp.isoformat()},P-04,1013.25,hPa"] * 5)
+
+    def test_stops_with_connected_persistent_client(self):
+        client = make_client(self.port, persistent="true")
+        wait_for_port(self.port)
+        self.assertTrue(client.send_sensor_data("S-0", 1.0, "u", datetime.now()))
+
+        # Klient pozostaje połączony - zatrzymanie serwera nie może na niego czekać
+        self.stop_event.set()
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+        client.close()
+        with open(self.server.logger.current_filename, encoding="utf-8") as f:
+            self.assertEqual(sum(1 for _ in f) - 1, 1)
+
+
+class TestBlockingNetworkServer(unittest.TestCase):
+
+    def test_rejected_reading_is_not_resent(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            port = free_port()
+            yaml_path = os.path.join(tmp, "config.yaml")
+            with open(yaml_path, "w", encoding="utf-8") as f:
+                f.write(f"server:\n  host: 127.0.0.1\n  port: {port}\n  mode: blocking\n"
+                        f"  log_path: {os.path.join(tmp, 'logs')}\n")
+            server = NetworkServer(yaml_path, write_logger_config(tmp))
+            stop_event = threading.Event()
+            thread = threading.Thread(target=server.serve, args=(stop_event,), daemon=True)
+            thread.start()
+            wait_for_port(port)
+
+            client = make_client(port)
+            readings = [("T-01", value, "°C", datetime(2025, 5, 1, 12, 0, i))
+                        for i, value in enumerate((1.0, "abc", 3.0, 4.0))]
+            self.assertEqual(client.send_batch(readings), 3)
+            self.assertEqual(client.rejected, 1)
+            stop_event.set()
+            thread.join(5)
+
+            with open(server.logger.current_filename, encoding="utf-8") as f:
+                values = [line.split(",")[2] for line in f.read().splitlines()[1:]]
+            self.assertEqual(values.count("4.0"), 1)
+            self.assertNotIn("abc", values)
+
+
+class TestMultiProcessServer(unittest.TestCase):
+
+    def test_workers_write_shards_merged_on_read(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            port = free_port()
+            yaml_path = os.path.join(tmp, "config.yaml")
+            with open(yaml_path, "w", encoding="utf-8") as f:
+                f.write(f"server:\n  host: 127.0.0.1\n  port: {port}\n  mode: async\n  workers: 2\n"
+                        f"  log_path: {os.path.join(tmp, 'logs')}\n")
+            json_path = write_logger_config(tmp)
+            server = NetworkServer(yaml_path, json_path)
+            self.assertIsNone(server.logger)
+            stop_event = threading.Event()
+            thread = threading.Thread(target=server.serve, args=(stop_event,), daemon=True)
+            thread.start()
+            wait_for_port(port, timeout=10)
+
+            start = datetime(2025, 5, 1, 12, 0)
+            for i in range(20):
+                client = make_client(port)
+                self.assertTrue(client.send_sensor_data("T-01", float(i), "°C", start + timedelta(seconds=i)))
+            stop_event.set()
+            thread.join(15)
+
+            logger = Logger(json_path)
+            self.assertTrue(set(logger.shards()) <= {0, 1})
+            self.assertFalse(os.path.exists(logger._get_log_filename()))
+            entries = list(read_merged_logs(json_path, start, start + timedelta(minutes=1)))
+            self.assertEqual([e["value"] for e in entries], [float(i) for i in range(20)])
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_small_fleet_smoke_run(self):
+        for target in ("server", "gui"):
+            report = benchmark.run(benchmark.parse_args(
+                ["--target", target, "--sensors", "4", "--readings", "50", "--batch-size", "10"]))
+            self.assertEqual(report["readings"], 200)
+            self.assertEqual(report["lost"], 0)
+            self.assertGreater(report["readings_per_s"], 0)
+            self.assertLessEqual(report["ack_p50_ms"], report["ack_p99_ms"])
+
+
 if __name__ == '__main__':
     unittest.main()